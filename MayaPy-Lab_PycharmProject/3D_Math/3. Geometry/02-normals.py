@@ -1,14 +1,10 @@
-import maya.api.OpenMaya as om
 import maya.cmds as cmds
 
+from MayaUtils.normals import applyNormals
+
 sel_name = cmds.ls(sl=True)[0]
-selection = om.MSelectionList()
-selection.add(sel_name)
-nodeDagPath = selection.getDagPath(0)
-mfnMesh = om.MFnMesh(nodeDagPath)
 
-for vertId in range(mfnMesh.numVertices):
-    vtPos = mfnMesh.getPoint(vertId, space=om.MSpace.kWorld) # kWorld for world
-    n = om.MVector(vtPos.x, vtPos.y, vtPos.z).normalize()
-    # do not use setFaceVertexNormal, since we don't need unshared normal per vertex
-    mfnMesh.setVertexNormal(n, vertId)
\ No newline at end of file
+# all points are read at once in world space, every normal points away from the world origin
+# and they are set with a single setVertexNormals; use mode='radial' to point away from the pivot
+# instead, or mode='smooth' for the area weighted average of the faces around every vertex
+applyNormals(sel_name, mode='center', center=(0, 0, 0))
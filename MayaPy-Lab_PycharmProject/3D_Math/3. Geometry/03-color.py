@@ -1,13 +1,9 @@
-import maya.api.OpenMaya as om
 import maya.cmds as cmds
-import random
+
+from MayaUtils.vertex_colors import applyRandomColors
 
 sel_name = cmds.ls(sl=True)[0]
-selection = om.MSelectionList()
-selection.add(sel_name)
-nodeDagPath = selection.getDagPath(0)
-mfnMesh = om.MFnMesh(nodeDagPath)
 
-for vertId in range(mfnMesh.numVertices):
-    col = om.MColor([random.random(), random.random(), random.random(), 1])
-    mfnMesh.setVertexColor(col, vertId)
\ No newline at end of file
+# every color is drawn at once from a seeded generator, so the same seed gives the same colors,
+# and set with a single setVertexColors; mode='face' or mode='shell' gives one color per face or shell
+applyRandomColors(sel_name, mode='vertex', seed=0)
@@ -0,0 +1,212 @@
+"""
+Headless batch runner for the boid and Gerstner wave simulations.
+
+    python batch_runner.py run.json --backend memory --output cache.npz
+    mayapy batch_runner.py run.yaml --backend maya --scene flock.ma --save baked.ma
+
+The config is JSON, or YAML when PyYAML is installed:
+
+    {
+        "simulation": "boids",          # or "waves"
+        "frames": 120,
+        "startTime": 1,
+        "boids": {"count": 100, "radius": 10.0, "seed": 0, "workers": 0,
+                  "params": {"detect_distance": 15.0, "detect_angle": 120.0}},
+        "waves": {"width": 20, "height": 20, "subdivisionsWidth": 10, "subdivisionsHeight": 10,
+                  "amplitude": 0.5, "frequency": 0.5, "speed": 0.5, "keyTolerance": 0.001}
+    }
+
+boids.params takes the BoidWidget option names. With the memory backend the
+flock comes from a seeded randomFlock and the results are dumped as an NPZ
+cache; with the maya backend the boids are read from the opened scene and the
+waves are built with polyPlane, both are baked to anim curves. waves.keyTolerance
+keeps only the wave keys key_reduction needs, null keys every frame. Wall-clock and
+per-phase timings are printed, or written with --timings, as JSON.
+"""
+from __future__ import division
+from __future__ import print_function
+from contextlib import contextmanager
+from timeit import default_timer
+import argparse
+import json
+import sys
+
+import numpy as np
+
+import gerstner
+from flock import FlockParams
+from flock import FlockState
+from flock import randomFlock
+from scene_backend import bakeFlock
+from scene_backend import RecordingBackend
+
+DEFAULT_CONFIG = {
+    'simulation': 'boids',
+    'frames': 120,
+    'startTime': 1,
+    'boids': {'count': 100, 'radius': 10.0, 'seed': None, 'workers': 0, 'params': {}},
+    'waves': {'width': 20.0, 'height': 20.0, 'subdivisionsWidth': 10, 'subdivisionsHeight': 10,
+              'amplitude': 0.5, 'frequency': 0.5, 'speed': 0.5, 'keyTolerance': None},
+}
+
+
+def loadConfig(path):
+    with open(path) as stream:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            loaded = yaml.safe_load(stream)
+        else:
+            loaded = json.load(stream)
+    config = dict(DEFAULT_CONFIG)
+    for key, value in (loaded or {}).items():
+        if isinstance(value, dict) and isinstance(config.get(key), dict):
+            config[key] = dict(config[key], **value)
+        else:
+            config[key] = value
+    return config
+
+
+class Timings(object):
+    """wall-clock seconds of the named phases of a run"""
+
+    def __init__(self):
+        super(Timings, self).__init__()
+        self.phases = {}
+        self._start = default_timer()
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        start = default_timer()
+        try:
+            yield
+        finally:
+            self.add(name, default_timer() - start)
+
+    def asDict(self):
+        return {'wallClock': default_timer() - self._start, 'phases': self.phases}
+
+
+def startMaya(scene=None):
+    import maya.standalone
+    try:
+        maya.standalone.initialize(name='python')
+    except RuntimeError:
+        # already inside a Maya session
+        pass
+    import maya.cmds as cmds
+    if scene:
+        cmds.file(scene, open=True, force=True)
+    return cmds
+
+
+def runBoids(config, backend, timings, cmds=None):
+    boidConfig = config['boids']
+    params = FlockParams.fromOptions(boidConfig['params'])
+    with timings.phase('setup'):
+        if cmds is None:
+            positions, velocities = randomFlock(boidConfig['count'], boidConfig['radius'], boidConfig['seed'])
+            names = ['boid{}'.format(i + 1) for i in range(len(positions))]
+        else:
+            names = cmds.ls('boid*', type='transform', long=True)
+            if not names:
+                raise ValueError('No boid transforms found in the scene.')
+            positions = backend.getDouble3(names, 'translate')
+            velocities = backend.getDouble3(names, 'velocity')
+        if boidConfig['workers']:
+            from flock_parallel import ParallelFlock
+            flock = ParallelFlock(positions, velocities, workers=boidConfig['workers'])
+        else:
+            flock = FlockState(positions, velocities)
+    try:
+        with timings.phase('simulateAndWrite'):
+            bakeFlock(flock, names, backend, config['frames'], config['startTime'], params)
+    finally:
+        if hasattr(flock, 'close'):
+            flock.close()
+    return {'boids': len(names)}
+
+
+def runWaves(config, backend, timings, cmds=None):
+    waveConfig = config['waves']
+    with timings.phase('setup'):
+        if cmds is None:
+            mesh = 'WavePlane'
+            backend.points[mesh] = gerstner.plane_points(
+                waveConfig['width'], waveConfig['height'],
+                waveConfig['subdivisionsWidth'], waveConfig['subdivisionsHeight'])
+        else:
+            mesh = cmds.polyPlane(n='WavePlane', w=waveConfig['width'], h=waveConfig['height'],
+                                  sw=waveConfig['subdivisionsWidth'], sh=waveConfig['subdivisionsHeight'])[0]
+        rest = backend.getRestPoints(mesh)
+    times = config['startTime'] + np.arange(config['frames'])
+    with timings.phase('simulate'):
+        waves = gerstner.GerstnerWaves(waveConfig['amplitude'], waveConfig['frequency'], waveConfig['speed'])
+        points = np.empty((len(times), len(rest), 3))
+        for i, time in enumerate(times):
+            waves.deform(rest, time, out=points[i])
+    with timings.phase('write'):
+        with backend.writeChunk('waveBake'):
+            reduction = backend.setPointAnimation(mesh, times, points, tolerance=waveConfig['keyTolerance'])
+    summary = {'vertices': len(rest)}
+    if reduction is not None:
+        summary.update({'keys': reduction.keptKeys, 'compression': reduction.ratio, 'maxError': reduction.maxError})
+    return summary
+
+
+SIMULATIONS = {
+    'boids': runBoids,
+    'waves': runWaves,
+}
+
+
+def run(config, backendName='memory', output=None, scene=None, save=None):
+    timings = Timings()
+    cmds = None
+    with timings.phase('startup'):
+        if backendName == 'maya':
+            from scene_backend import MayaBackend
+            cmds = startMaya(scene)
+            backend = MayaBackend(cmds=cmds)
+        elif backendName == 'memory':
+            backend = RecordingBackend()
+        else:
+            raise ValueError('Unknown backend {!r}.'.format(backendName))
+    if config['simulation'] not in SIMULATIONS:
+        raise ValueError('Unknown simulation {!r}.'.format(config['simulation']))
+    summary = SIMULATIONS[config['simulation']](config, backend, timings, cmds=cmds)
+    with timings.phase('save'):
+        if output and backendName == 'memory':
+            backend.save(output)
+        if save and cmds is not None:
+            cmds.file(rename=save)
+            cmds.file(save=True, force=True)
+    report = timings.asDict()
+    report.update(summary)
+    report.update({'simulation': config['simulation'], 'frames': config['frames'], 'backend': backendName})
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the boid or wave simulation without the Qt tools.')
+    parser.add_argument('config', help='JSON or YAML run description')
+    parser.add_argument('--backend', choices=('memory', 'maya'), default='memory')
+    parser.add_argument('--output', help='NPZ cache written by the memory backend')
+    parser.add_argument('--scene', help='scene opened before the run, maya backend only')
+    parser.add_argument('--save', help='path the scene is saved to after the run, maya backend only')
+    parser.add_argument('--timings', help='write the timing report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    report = run(loadConfig(args.config), args.backend, output=args.output, scene=args.scene, save=args.save)
+    if args.timings:
+        with open(args.timings, 'w') as stream:
+            json.dump(report, stream, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
 from __future__ import division
 from collections import namedtuple
-import math
+import itertools
 import random
 
 import maya.cmds as cmds
@@ -9,150 +9,17 @@ from maya.app.general.mayaMixin import MayaQWidgetBaseMixin
 from Qt import QtCore
 from Qt import QtWidgets
 
+from flock import FlockParams
+from flock import FlockState
+from flock import randomFlock
+from preview_scheduler import PreviewScheduler
+from scene_backend import bakeFlock
+from scene_backend import BoidWriteBack
+from scene_backend import MayaBackend
 
-def angledDetector(distance, angle):
-    cosAngle = math.cos(angle / 180 * math.pi)
-
-    def detector(boid1, boid2):
-        toBoid2 = (boid1.position - boid2.position)
-        if toBoid2.length() > distance:
-            return False
-        if boid1.velocity.normalized().dot(toBoid2.normalized()) > cosAngle:
-            return False
-        return True
-    return detector
-
-
-class Vec3(object):
-    def __init__(self, x=0.0, y=0.0, z=0.0):
-        super(Vec3, self).__init__()
-        self.x = x
-        self.y = y
-        self.z = z
-
-    def __add__(self, other):
-        return Vec3(self.x + other.x, self.y + other.y, self.z + other.z)
-
-    def __neg__(self):
-        return Vec3(-self.x, -self.y, -self.z)
-
-    def __sub__(self, other):
-        return self + (-other)
-
-    def length(self):
-        return math.sqrt(self.dot(self))
-
-    def normalize(self):
-        length = self.length()
-        if length != 0:
-            self.x /= length
-            self.y /= length
-            self.z /= length
-
-    def normalizeTo(self, length):
-        self.normalize()
-        self *= length
-
-    def normalized(self):
-        length = self.length()
-        if length != 0:
-            return Vec3(self.x / length, self.y / length, self.z / length)
-        return Vec3()
-
-    def dot(self, other):
-        return sum(self * other)
-
-    def __iter__(self):
-        return iter((self.x, self.y, self.z))
-
-    def __mul__(self, other):
-        if isinstance(other, (float, int)):
-            return Vec3(self.x * other, self.y * other, self.z * other)
-        elif isinstance(other, Vec3):
-            return Vec3(self.x * other.x, self.y * other.y, self.z * other.z)
-        raise ValueError('Vec3 can only multiplies number or Vec3.')
-
-    def __truediv__(self, other):
-        if isinstance(other, (float, int)):
-            return self * (1 / other)
-        raise ValueError('Vec3 can only divide number.')
-
-    def __rtruediv__(self, other):
-        if isinstance(other, (float, int)):
-            return Vec3(other / self.x, other / self.y, other / self.z)
-        raise ValueError('Only number can divide Vec3.')
-
-    def __repr__(self):
-        return 'Vec3({}, {}, {}, length={})'.format(self.x, self.y, self.z, self.length())
-
-
-class Boid(object):
-    def __init__(self, name):
-        super(Boid, self).__init__()
-        self.name = name
-        self.position = Vec3(*cmds.getAttr('{}.translate'.format(name))[0])
-        self.velocity = Vec3(*cmds.getAttr('{}.velocity'.format(name))[0])
-        self.force = Vec3()
-
-    def addForce(self, force):
-        self.force += force
-
-    def applyForce(self):
-        self.velocity += self.force
-        self.force = Vec3()
-        cmds.setAttr('{}.velocity'.format(self.name), self.velocity.x, self.velocity.y, self.velocity.z, type='double3')
-
-    def applyVelocity(self):
-        self.position += self.velocity
-        cmds.move(self.position.x, self.position.y, self.position.z, self.name, relative=False)
-
-    def limitVelocity(self, low, high):
-        currentLength = self.velocity.length()
-        if currentLength > high:
-            self.velocity.normalizeTo(high)
-        elif currentLength < low:
-            self.velocity.normalizeTo(low)
-
-    def attract(self, position, multiplier):
-        self.addForce((position - self.position) * multiplier)
-
-    def avoid(self, neighbours, multiplier):
-        for other in neighbours:
-            self.addForce(1 / (self.position - other.position) * multiplier)
-
-    def align(self, neighbours, factor):
-        if not neighbours:
-            return
-        vels = []
-        for other in neighbours:
-            vels.append(other.velocity.normalized())
-        length = self.velocity.length()
-        # this should be slerp instead of lerp
-        direction = self.velocity.normalized() * (1 - factor) + sum(vels, Vec3()).normalized() * factor
-        self.velocity = direction * length
-
-    def followCenter(self, neighbours, multiplier):
-        if not neighbours:
-            return
-        poss = []
-        for other in neighbours:
-            poss.append(other.position)
-        center = sum(poss, Vec3()) / len(neighbours)
-        self.addForce((center - self.position) * multiplier)
-
-    def applyBorder(self, low, high):
-        while self.position.x < low.x:
-            self.position.x += (high.x - low.x)
-        while self.position.y < low.y:
-            self.position.y += (high.y - low.y)
-        while self.position.z < low.z:
-            self.position.z += (high.z - low.z)
-        while self.position.x > high.x:
-            self.position.x -= (high.x - low.x)
-        while self.position.y > high.y:
-            self.position.y -= (high.y - low.y)
-        while self.position.z > high.z:
-            self.position.z -= (high.z - low.z)
+
+def loadFlock(names, backend):
+    return FlockState(backend.getDouble3(names, 'translate'), backend.getDouble3(names, 'velocity'))
 
 
 def clamp(value, minimum, maximum):
@@ -170,6 +37,7 @@ class AutoRangeSlider(QtWidgets.QSlider):
 
 
 class OptionWidget(QtWidgets.QWidget):
+    valueChanged = QtCore.Signal(object)
 
     def value(self):
         raise NotImplementedError()
@@ -192,7 +60,10 @@ class FloatOptionWidget(OptionWidget):
         return self._value
 
     def setValue(self, value):
+        changed = getattr(self, '_value', None) != value
         self._value = value
+        if changed:
+            self.valueChanged.emit(value)
 
     def _setupUI(self):
         self._layout = QtWidgets.QHBoxLayout()
@@ -262,7 +133,10 @@ class IntOptionWidget(OptionWidget):
         return self._value
 
     def setValue(self, value):
+        changed = getattr(self, '_value', None) != value
         self._value = value
+        if changed:
+            self.valueChanged.emit(value)
 
     def _setupUI(self):
         self._layout = QtWidgets.QHBoxLayout()
@@ -315,12 +189,12 @@ class BoidWidget(MayaQWidgetBaseMixin, QtWidgets.QWidget):
 
     def __init__(self, parent=None):
         super(BoidWidget, self).__init__(parent=parent)
-        self.stop = False
         self.simulating = False
         self._options = [
             Option('radius', 'Radius', 'float', {'minimum': 0.0, 'maximum': 100.0, 'default': 10.0}),
             Option('count', 'Count', 'int', {'minimum': 0, 'maximum': 200, 'default': 100, 'clamp': False}),
             Option('frame', 'Frame', 'int', {'minimum': 0, 'maximum': 200, 'default': 120, 'clamp': False}),
+            Option('fps', 'FPS', 'int', {'minimum': 1, 'maximum': 120, 'default': 24, 'clamp': False}),
             Option('attract_multiplier', 'Attract', 'float', {
                    'minimum': 0.0, 'maximum': 1.0, 'default': 0.1, 'clamp': False}),
             Option('avoid_multiplier', 'Avoid', 'float', {'minimum': 0.0,
@@ -338,6 +212,10 @@ class BoidWidget(MayaQWidgetBaseMixin, QtWidgets.QWidget):
                    'minimum': 0.0, 'maximum': 180.0, 'default': 120.0, 'clamp': True}),
         ]
         self._optionWidgets = {}
+        self._params = None
+        self._scheduler = None
+        self._stopRequested = False
+        self._time = None
         self._setupUI()
         self._connectSignals()
         self.setWindowTitle('Boids')
@@ -367,6 +245,9 @@ class BoidWidget(MayaQWidgetBaseMixin, QtWidgets.QWidget):
         self._simulateButton = QtWidgets.QPushButton('Simulate')
         self._buttonsLayout.addWidget(self._simulateButton)
 
+        self._bakeButton = QtWidgets.QPushButton('Bake')
+        self._buttonsLayout.addWidget(self._bakeButton)
+
         self._runButton = QtWidgets.QPushButton('Run')
         self._buttonsLayout.addWidget(self._runButton)
 
@@ -377,10 +258,13 @@ class BoidWidget(MayaQWidgetBaseMixin, QtWidgets.QWidget):
         return self._optionWidgets[name].value()
 
     def _connectSignals(self):
+        for optionWidget in self._optionWidgets.values():
+            optionWidget.valueChanged.connect(self._optionValueChangedSlot)
         self._resetButton.clicked.connect(self._resetButtonClickedSlot)
         self._generateButton.clicked.connect(self._generateButtonClickedSlot)
         self._runButton.clicked.connect(self._runButtonClickedSlot)
         self._simulateButton.clicked.connect(self._simulateButtonClickedSlot)
+        self._bakeButton.clicked.connect(self._bakeButtonClickedSlot)
         self._stopButton.clicked.connect(self._stopButtonClickedSlot)
 
     def _resetButtonClickedSlot(self):
@@ -391,20 +275,10 @@ class BoidWidget(MayaQWidgetBaseMixin, QtWidgets.QWidget):
             cmds.currentTime(1, edit=True)
 
     def _generateButtonClickedSlot(self):
-        count = self.getOptionValue('count')
-        radius = self.getOptionValue('radius')
-        for i in range(count):
+        positions, velocities = randomFlock(self.getOptionValue('count'), self.getOptionValue('radius'))
+        for (x, y, z), (xn, yn, zn) in zip(positions.tolist(), velocities.tolist()):
             boid = cmds.polyCube(w=1, h=1, d=1)[0]
             boid = cmds.rename(boid, 'boid')
-            length = radius * random.uniform(0, 1)
-            radXZ = 2 * math.pi * random.uniform(0, 1)
-            radY = math.pi * random.uniform(-1, 1)
-            xn = math.sin(radXZ) * math.cos(radY)
-            yn = math.cos(radXZ) * math.cos(radY)
-            zn = math.sin(radY)
-            x = xn * length
-            y = yn * length
-            z = zn * length
             cmds.move(x, y, z, boid)
             cmds.addAttr(boid, longName="velocity", attributeType='double3')
             cmds.addAttr(boid, longName="velocityX", attributeType='double', p='velocity')
@@ -423,68 +297,90 @@ class BoidWidget(MayaQWidgetBaseMixin, QtWidgets.QWidget):
     def _simulateButtonClickedSlot(self):
         self.simulate(frames=self.getOptionValue('frame'))
 
+    def _bakeButtonClickedSlot(self):
+        self.bake(frames=self.getOptionValue('frame'))
+
     @property
     def attractMultiplier(self):
         return self._attractMultiplier
 
-    def simulateSingleFrame(self, boids, detector, update=True):
-        QtWidgets.QApplication.instance().processEvents()
-        # selection = set(cmds.ls(selection=True, long=True, type='transform') or [])
-        detector = angledDetector(
-            distance=self.getOptionValue('detect_distance'),
-            angle=self.getOptionValue('detect_angle')
-        )
-        for boid in boids:
-            # force based
-            boid.attract(Vec3(), self.getOptionValue('attract_multiplier'))
-
-            neighbours = [other for other in boids if other is not boid and detector(boid, other)]
-            boid.avoid(neighbours, multiplier=self.getOptionValue('avoid_multiplier'))
-            boid.followCenter(neighbours, multiplier=self.getOptionValue('follow_multiplier'))
-            boid.applyForce()
-
-            # velocity based
-            boid.align(neighbours, factor=self.getOptionValue('align_factor'))
-
-            boid.limitVelocity(
-                self.getOptionValue('min_velocity'),
-                self.getOptionValue('max_velocity')
-            )
-            boid.applyVelocity()
+    def readParams(self):
+        return FlockParams.fromOptions(dict((name, self.getOptionValue(name)) for name in self._optionWidgets))
 
-            # boid.applyBorder(Vec3(-30, -30, -30), Vec3(30, 30, 30))
-            if update:
-                cmds.setKeyframe('{}.translate'.format(boid.name))
+    def _optionValueChangedSlot(self, value):
+        # only a running simulation holds a snapshot, the next run reads the widgets anyway
+        if self._params is not None:
+            self._params = self.readParams()
 
     def _runButtonClickedSlot(self):
         self.simulate(False)
 
     def simulate(self, update=True, frames=-1):
+        """
+        update keys every frame as fast as the flock steps, the UI is served between frames so Stop and the
+        options stay live; otherwise preview the flock without blocking Maya, the flock then steps in the
+        scheduler's worker thread; frames <= 0 runs until stopped
+        """
+        if self.simulating:
+            return
         self.simulating = True
-        boids = [Boid(name) for name in cmds.ls('boid*', type='transform', long=True)]
-        time = cmds.currentTime(query=True)
-
-        def infinite():
-            while True:
-                yield None
-
-        for _ in (range(frames) if frames > 0 else infinite()):
-            print(frames)
-            if self.stop:
-                self.stop = False
-                break
-            self.simulateSingleFrame(boids, update)
-            if update:
-                time += 1
-                cmds.currentTime(time, edit=True)
-            else:
-                cmds.refresh()
+        self._params = self.readParams()
+        names = cmds.ls('boid*', type='transform', long=True)
+        backend = MayaBackend()
+        flock = loadFlock(names, backend)
+        writeBack = BoidWriteBack(names, backend)
+        self._time = cmds.currentTime(query=True)
+
+        if update:
+            self._stopRequested = False
+            try:
+                for _ in (range(frames) if frames > 0 else itertools.count()):
+                    QtWidgets.QApplication.instance().processEvents()
+                    if self._stopRequested:
+                        break
+                    flock.step(self._params)
+                    writeBack.gather(flock)
+                    writeBack.flush(keyframe=True)
+                    self._time += 1
+                    cmds.currentTime(self._time, edit=True)
+            finally:
+                self.simulating = False
+                self._stopRequested = False
+                self._params = None
+            return
+
+        def step(frame, params):
+            # every finished step is written, so the flock never skips a frame even when ticks are dropped
+            flock.step(params)
+            # flock.applyBorder((-30, -30, -30), (30, 30, 30))
+            writeBack.gather(flock)
+
+        def write(frame, result):
+            writeBack.flush()
 
+        self._scheduler = PreviewScheduler(step, write, fps=self.getOptionValue('fps'), frames=frames,
+                                           snapshot=lambda: self._params, parent=self)
+        self._scheduler.finished.connect(self._simulationFinishedSlot)
+        self._scheduler.start(self._time)
+
+    def _simulationFinishedSlot(self):
+        print(self._scheduler.stats())
+        self._scheduler = None
         self.simulating = False
+        self._params = None
+
+    def bake(self, frames):
+        names = cmds.ls('boid*', type='transform', long=True)
+        backend = MayaBackend()
+        flock = loadFlock(names, backend)
+        bakeFlock(flock, names, backend, frames, cmds.currentTime(query=True), self.readParams())
 
     def _stopButtonClickedSlot(self):
-        if self.simulating:
-            self.stop = True
+        if self._scheduler is not None:
+            self._scheduler.stop()
+        elif self.simulating:
+            # the keyed loop checks the flag once per frame
+            self._stopRequested = True
 
 
 def main():
@@ -0,0 +1,462 @@
+"""
+Maya-free flocking core used by boids.py.
+
+FlockState keeps the whole flock in contiguous (N, 3) float arrays and runs the
+boid rules (attract, avoid, followCenter, align, limitVelocity) for every boid
+at once. Boid and Vec3 are kept as thin per-boid views so the old object style
+code still works on top of the arrays.
+
+Tolerance against the per-boid rules:
+    Every rule matches the Vec3/Boid implementation to 1e-9 (float64) when the
+    other boids are held at their start-of-frame state. The flock is stepped
+    synchronously: every boid reads the positions and velocities its
+    neighbours had at the start of the frame. The old loop updated boids in
+    place, so boid k already saw the moved boids 0..k-1. Whole-frame
+    trajectories therefore drift apart by that ordering effect only.
+    A neighbour sitting exactly on the detect distance or cone border can flip
+    classification through float rounding. A zero offset component in avoid
+    contributes nothing instead of raising ZeroDivisionError.
+
+Intended change:
+    limitVelocity clamps speeds to [minVelocity, maxVelocity]. The old
+    Vec3.normalizeTo rebound a local name instead of scaling, so any velocity
+    outside the limits came out at unit length; the fixed normalizeTo and the
+    Boid view follow the new behaviour too.
+"""
+from __future__ import division
+from collections import namedtuple
+from timeit import default_timer
+import math
+
+import numpy as np
+
+from spatial_index import cellSizeFor
+from spatial_index import UniformGrid
+
+
+def angledDetector(distance, angle):
+    cosAngle = math.cos(angle / 180 * math.pi)
+
+    def detector(boid1, boid2):
+        toBoid2 = (boid1.position - boid2.position)
+        if toBoid2.length() > distance:
+            return False
+        if boid1.velocity.normalized().dot(toBoid2.normalized()) > cosAngle:
+            return False
+        return True
+    return detector
+
+
+class Vec3(object):
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        super(Vec3, self).__init__()
+        self.x = x
+        self.y = y
+        self.z = z
+
+    def __add__(self, other):
+        return Vec3(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def __neg__(self):
+        return Vec3(-self.x, -self.y, -self.z)
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def length(self):
+        return math.sqrt(self.dot(self))
+
+    def normalize(self):
+        length = self.length()
+        if length != 0:
+            self.x /= length
+            self.y /= length
+            self.z /= length
+
+    def normalizeTo(self, length):
+        self.normalize()
+        self.x *= length
+        self.y *= length
+        self.z *= length
+
+    def normalized(self):
+        length = self.length()
+        if length != 0:
+            return Vec3(self.x / length, self.y / length, self.z / length)
+        return Vec3()
+
+    def dot(self, other):
+        return sum(self * other)
+
+    def __iter__(self):
+        return iter((self.x, self.y, self.z))
+
+    def __mul__(self, other):
+        if isinstance(other, (float, int)):
+            return Vec3(self.x * other, self.y * other, self.z * other)
+        elif isinstance(other, Vec3):
+            return Vec3(self.x * other.x, self.y * other.y, self.z * other.z)
+        raise ValueError('Vec3 can only multiplies number or Vec3.')
+
+    def __truediv__(self, other):
+        if isinstance(other, (float, int)):
+            return self * (1 / other)
+        raise ValueError('Vec3 can only divide number.')
+
+    def __rtruediv__(self, other):
+        if isinstance(other, (float, int)):
+            return Vec3(other / self.x, other / self.y, other / self.z)
+        raise ValueError('Only number can divide Vec3.')
+
+    def __repr__(self):
+        return 'Vec3({}, {}, {}, length={})'.format(self.x, self.y, self.z, self.length())
+
+
+# neighbour pairs of a frame: cols[k] is a neighbour of rows[k], counts[i] is the neighbour count of boid i
+# positions / velocities hold the start-of-frame state of every cols[k], so the rules never read the moved flock
+Neighbours = namedtuple('Neighbours', ['rows', 'cols', 'counts', 'positions', 'velocities'])
+
+
+class FlockParams(object):
+    """
+    immutable snapshot of the simulation options, with the derived values the core needs
+    take a new one with replace() when an option changes
+    """
+    __slots__ = ('attractMultiplier', 'avoidMultiplier', 'followMultiplier', 'alignFactor',
+                 'minVelocity', 'maxVelocity', 'detectDistance', 'detectAngle', 'center',
+                 'cosAngle', 'detectDistanceSq')
+
+    # BoidWidget option name -> FlockParams field
+    optionNames = {
+        'attract_multiplier': 'attractMultiplier',
+        'avoid_multiplier': 'avoidMultiplier',
+        'follow_multiplier': 'followMultiplier',
+        'align_factor': 'alignFactor',
+        'min_velocity': 'minVelocity',
+        'max_velocity': 'maxVelocity',
+        'detect_distance': 'detectDistance',
+        'detect_angle': 'detectAngle',
+    }
+
+    def __init__(self, attractMultiplier=0.1, avoidMultiplier=0.1, followMultiplier=0.3, alignFactor=0.3,
+                 minVelocity=0.1, maxVelocity=3.0, detectDistance=15.0, detectAngle=120.0, center=(0.0, 0.0, 0.0)):
+        values = {
+            'attractMultiplier': float(attractMultiplier),
+            'avoidMultiplier': float(avoidMultiplier),
+            'followMultiplier': float(followMultiplier),
+            'alignFactor': float(alignFactor),
+            'minVelocity': float(minVelocity),
+            'maxVelocity': float(maxVelocity),
+            'detectDistance': float(detectDistance),
+            'detectAngle': float(detectAngle),
+            'center': tuple(float(value) for value in center),
+            'cosAngle': math.cos(detectAngle / 180 * math.pi),
+            'detectDistanceSq': float(detectDistance) * detectDistance,
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def fromOptions(cls, options):
+        """build from a mapping of BoidWidget option names, other keys are ignored"""
+        return cls(**dict((field, options[name]) for name, field in cls.optionNames.items() if name in options))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('FlockParams is immutable, use replace().')
+
+    def __reduce__(self):
+        return self.__class__, (self.attractMultiplier, self.avoidMultiplier, self.followMultiplier,
+                                self.alignFactor, self.minVelocity, self.maxVelocity, self.detectDistance,
+                                self.detectAngle, self.center)
+
+    def __eq__(self, other):
+        return isinstance(other, FlockParams) and self.__reduce__()[1] == other.__reduce__()[1]
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.__reduce__()[1])
+
+    def replace(self, **changes):
+        values = self.asDict()
+        values.update(changes)
+        return self.__class__(**values)
+
+    def asDict(self):
+        fields = ('attractMultiplier', 'avoidMultiplier', 'followMultiplier', 'alignFactor',
+                  'minVelocity', 'maxVelocity', 'detectDistance', 'detectAngle', 'center')
+        return dict(zip(fields, self.__reduce__()[1]))
+
+    def __repr__(self):
+        return 'FlockParams({})'.format(', '.join('{}={!r}'.format(*item) for item in sorted(self.asDict().items())))
+
+
+def _rowLengths(vectors):
+    return np.sqrt(np.einsum('ij,ij->i', vectors, vectors))
+
+
+def _normalizedRows(vectors):
+    # zero vectors stay zero, like Vec3.normalized
+    lengths = _rowLengths(vectors)
+    safeLengths = np.where(lengths > 0, lengths, 1.0)
+    return vectors / safeLengths[:, None]
+
+
+def _sumRows(values, rows, count):
+    return np.stack([np.bincount(rows, weights=values[:, k], minlength=count) for k in range(3)], axis=1)
+
+
+class FlockState(object):
+    # upper bound of (rows x boids) offsets held in memory by the dense neighbour search
+    blockElements = 1 << 21
+
+    def __init__(self, positions, velocities, neighbourIndex=None, copy=True):
+        super(FlockState, self).__init__()
+        # copy=False keeps float64 arrays as they are, e.g. views into shared memory
+        asArray = np.array if copy else np.asarray
+        self.positions = asArray(positions, dtype=np.float64).reshape(-1, 3)
+        self.velocities = asArray(velocities, dtype=np.float64).reshape(-1, 3)
+        if self.positions.shape != self.velocities.shape:
+            raise ValueError('FlockState needs one velocity per position.')
+        self.forces = np.zeros_like(self.positions)
+        # rebuilt every frame, denseNeighbours keeps the O(N^2) search as reference
+        self.neighbourIndex = UniformGrid() if neighbourIndex is None else neighbourIndex
+        self.timings = dict.fromkeys(('build', 'query', 'cone'), 0.0)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _neighbours(self, rows, cols, count):
+        return Neighbours(rows, cols, np.bincount(rows, minlength=count), self.positions[cols], self.velocities[cols])
+
+    def neighbours(self, params, rows=None, rebuild=True):
+        """
+        same test as angledDetector, run only on the candidates of the neighbour index
+        with rows, only those boids are searched and the pairs are numbered within rows
+        rebuild=False reuses the index of the previous call, for several row queries on one frame
+        """
+        distance = params.detectDistance
+        cosAngle = params.cosAngle
+        index = self.neighbourIndex
+        if rebuild:
+            index.build(self.positions, cellSizeFor(distance))
+        pairRows, cols = index.pairs(distance, rows)
+        start = default_timer()
+        own = self.positions if rows is None else self.positions[rows]
+        ownVelocities = self.velocities if rows is None else self.velocities[rows]
+        # toBoid2 of angledDetector, from the neighbour to the boid
+        offsets = own[pairRows] - self.positions[cols]
+        lengths = _rowLengths(offsets)
+        dots = np.einsum('ij,ij->i', _normalizedRows(ownVelocities)[pairRows], offsets)
+        keep = dots / np.where(lengths > 0, lengths, 1.0) <= cosAngle
+        self.timings['build'] = index.buildTime
+        self.timings['query'] = index.queryTime
+        self.timings['cone'] = default_timer() - start
+        return self._neighbours(pairRows[keep], cols[keep], len(own))
+
+    def denseNeighbours(self, params):
+        """same test as angledDetector, for every pair of boids"""
+        cosAngle = params.cosAngle
+        count = len(self)
+        directions = _normalizedRows(self.velocities)
+        block = max(1, self.blockElements // max(count, 1))
+        rows = []
+        cols = []
+        for start in range(0, count, block):
+            stop = min(start + block, count)
+            # toBoid2 of angledDetector, from every other boid to the boids of this block
+            offsets = self.positions[start:stop, None, :] - self.positions[None, :, :]
+            lengthsSq = np.einsum('ijk,ijk->ij', offsets, offsets)
+            lengths = np.sqrt(lengthsSq)
+            dots = np.einsum('ik,ijk->ij', directions[start:stop], offsets)
+            cosines = dots / np.where(lengths > 0, lengths, 1.0)
+            mask = (lengthsSq <= params.detectDistanceSq) & (cosines <= cosAngle)
+            mask[np.arange(stop - start), np.arange(start, stop)] = False
+            blockRows, blockCols = np.nonzero(mask)
+            rows.append(blockRows + start)
+            cols.append(blockCols)
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.intp)
+        cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.intp)
+        return self._neighbours(rows, cols, count)
+
+    def attract(self, position, multiplier):
+        self.forces += (np.asarray(tuple(position), dtype=np.float64) - self.positions) * multiplier
+
+    def avoid(self, neighbours, multiplier):
+        offsets = self.positions[neighbours.rows] - neighbours.positions
+        nonZero = offsets != 0
+        inverse = np.zeros_like(offsets)
+        inverse[nonZero] = 1 / offsets[nonZero]
+        self.forces += _sumRows(inverse, neighbours.rows, len(self)) * multiplier
+
+    def followCenter(self, neighbours, multiplier):
+        hasNeighbours = neighbours.counts > 0
+        sums = _sumRows(neighbours.positions, neighbours.rows, len(self))
+        centers = sums[hasNeighbours] / neighbours.counts[hasNeighbours, None]
+        self.forces[hasNeighbours] += (centers - self.positions[hasNeighbours]) * multiplier
+
+    def applyForce(self):
+        self.velocities += self.forces
+        self.forces[:] = 0.0
+
+    def align(self, neighbours, factor):
+        hasNeighbours = neighbours.counts > 0
+        headings = _sumRows(_normalizedRows(neighbours.velocities), neighbours.rows, len(self))
+        own = self.velocities[hasNeighbours]
+        # this should be slerp instead of lerp
+        directions = _normalizedRows(own) * (1 - factor) + _normalizedRows(headings[hasNeighbours]) * factor
+        self.velocities[hasNeighbours] = directions * _rowLengths(own)[:, None]
+
+    def limitVelocity(self, low, high):
+        lengths = _rowLengths(self.velocities)
+        targets = np.where(lengths > high, high, np.where(lengths < low, low, lengths))
+        scales = np.where(lengths > 0, targets / np.where(lengths > 0, lengths, 1.0), 0.0)
+        self.velocities *= scales[:, None]
+
+    def applyVelocity(self):
+        self.positions += self.velocities
+
+    def applyBorder(self, low, high):
+        low = np.asarray(tuple(low), dtype=np.float64)
+        high = np.asarray(tuple(high), dtype=np.float64)
+        outside = (self.positions < low) | (self.positions > high)
+        wrapped = low + np.mod(self.positions - low, high - low)
+        self.positions[outside] = wrapped[outside]
+
+    def step(self, params, neighbours=None):
+        """advance the whole flock by one frame, in the order of the old per-boid loop"""
+        # force based
+        self.attract(params.center, params.attractMultiplier)
+        if neighbours is None:
+            neighbours = self.neighbours(params)
+        self.avoid(neighbours, params.avoidMultiplier)
+        self.followCenter(neighbours, params.followMultiplier)
+        self.applyForce()
+
+        # velocity based
+        self.align(neighbours, params.alignFactor)
+        self.limitVelocity(params.minVelocity, params.maxVelocity)
+        self.applyVelocity()
+        return neighbours
+
+    def stepRows(self, rows, params, rebuild=True):
+        """
+        step only the given boids against the start-of-frame state of the whole flock
+        the flock is left untouched, the stepped boids come back as a new FlockState
+        every row gets exactly the values step() would give it
+        """
+        neighbours = self.neighbours(params, rows=rows, rebuild=rebuild)
+        stepped = FlockState(self.positions[rows], self.velocities[rows], neighbourIndex=self.neighbourIndex)
+        stepped.step(params, neighbours=neighbours)
+        return stepped
+
+
+def randomFlock(count, radius, seed=None):
+    """positions and unit velocities spread like the boids of BoidWidget's Generate button"""
+    random = np.random.RandomState(seed)
+    length = radius * random.uniform(0, 1, count)
+    radXZ = 2 * math.pi * random.uniform(0, 1, count)
+    radY = math.pi * random.uniform(-1, 1, count)
+    velocities = np.stack([
+        np.sin(radXZ) * np.cos(radY),
+        np.cos(radXZ) * np.cos(radY),
+        np.sin(radY),
+    ], axis=1)
+    return velocities * length[:, None], velocities
+
+
+class Boid(object):
+    """view over one row of a FlockState"""
+
+    def __init__(self, flock, index, name=None):
+        super(Boid, self).__init__()
+        self.flock = flock
+        self.index = index
+        self.name = name
+
+    @property
+    def position(self):
+        return Vec3(*self.flock.positions[self.index].tolist())
+
+    @position.setter
+    def position(self, value):
+        self.flock.positions[self.index] = tuple(value)
+
+    @property
+    def velocity(self):
+        return Vec3(*self.flock.velocities[self.index].tolist())
+
+    @velocity.setter
+    def velocity(self, value):
+        self.flock.velocities[self.index] = tuple(value)
+
+    @property
+    def force(self):
+        return Vec3(*self.flock.forces[self.index].tolist())
+
+    @force.setter
+    def force(self, value):
+        self.flock.forces[self.index] = tuple(value)
+
+    def addForce(self, force):
+        self.force += force
+
+    def applyForce(self):
+        self.velocity += self.force
+        self.force = Vec3()
+
+    def applyVelocity(self):
+        self.position += self.velocity
+
+    def limitVelocity(self, low, high):
+        velocity = self.velocity
+        currentLength = velocity.length()
+        if currentLength > high:
+            velocity.normalizeTo(high)
+        elif currentLength < low:
+            velocity.normalizeTo(low)
+        self.velocity = velocity
+
+    def attract(self, position, multiplier):
+        self.addForce((position - self.position) * multiplier)
+
+    def avoid(self, neighbours, multiplier):
+        for other in neighbours:
+            self.addForce(1 / (self.position - other.position) * multiplier)
+
+    def align(self, neighbours, factor):
+        if not neighbours:
+            return
+        vels = []
+        for other in neighbours:
+            vels.append(other.velocity.normalized())
+        length = self.velocity.length()
+        # this should be slerp instead of lerp
+        direction = self.velocity.normalized() * (1 - factor) + sum(vels, Vec3()).normalized() * factor
+        self.velocity = direction * length
+
+    def followCenter(self, neighbours, multiplier):
+        if not neighbours:
+            return
+        poss = []
+        for other in neighbours:
+            poss.append(other.position)
+        center = sum(poss, Vec3()) / len(neighbours)
+        self.addForce((center - self.position) * multiplier)
+
+    def applyBorder(self, low, high):
+        position = self.position
+        while position.x < low.x:
+            position.x += (high.x - low.x)
+        while position.y < low.y:
+            position.y += (high.y - low.y)
+        while position.z < low.z:
+            position.z += (high.z - low.z)
+        while position.x > high.x:
+            position.x -= (high.x - low.x)
+        while position.y > high.y:
+            position.y -= (high.y - low.y)
+        while position.z > high.z:
+            position.z -= (high.z - low.z)
+        self.position = position
@@ -0,0 +1,205 @@
+"""
+Process-pool stepping of a FlockState across CPU cores.
+
+The flock lives in one multiprocessing.shared_memory block that every worker
+maps once when the pool starts, so a frame only sends small
+(frame, start, stop) tuples through the pool. The FlockParams live in the same
+block with a version number: step() rewrites them when they differ from the
+last frame's, and a worker rebuilds its FlockParams whenever the version
+changed, so a changed option reaches every worker on the next frame. Each frame
+the boids are sorted into spatial tiles (slabs of detect_distance cells along
+x), every worker steps whole tiles with FlockState.stepRows against the
+start-of-frame state and writes its rows to the output arrays. Each worker
+builds the neighbour index once per frame. Rows never depend on each other
+within a frame, so the result is bit-identical to the serial FlockState.step
+for any worker count.
+
+The neighbour search and the integration of a tile run in the same task on
+purpose: a row's integration only needs its own forces and neighbours, which
+the worker already holds, so a separate integrate phase would cost a second
+pool round trip per frame and shipping the neighbour lists back, for no extra
+parallelism.
+
+Inside interactive Maya the pool must be started with the spawn context and
+multiprocessing.set_executable pointing at mayapy, never by forking Maya.
+"""
+from __future__ import division
+from multiprocessing import shared_memory
+from timeit import default_timer
+import multiprocessing
+
+import numpy as np
+
+from flock import FlockParams
+from flock import FlockState
+from spatial_index import cellSizeFor
+
+# arrays laid out one after the other in the shared block, all (N, 3) float64
+_ARRAY_NAMES = ('positions', 'velocities', 'nextPositions', 'nextVelocities')
+
+# scalar FlockParams fields kept in the shared block after the version, followed by the 3 center values
+_PARAM_FIELDS = ('attractMultiplier', 'avoidMultiplier', 'followMultiplier', 'alignFactor',
+                 'minVelocity', 'maxVelocity', 'detectDistance', 'detectAngle')
+_PARAM_SIZE = 1 + len(_PARAM_FIELDS) + 3
+
+# state of a worker process, filled once by _attachWorker
+_worker = {}
+
+
+def _sharedArrays(buffer, count):
+    size = count * 3
+    arrays = dict(
+        (name, np.ndarray((count, 3), dtype=np.float64, buffer=buffer, offset=i * size * 8))
+        for i, name in enumerate(_ARRAY_NAMES)
+    )
+    orderOffset = len(_ARRAY_NAMES) * size * 8
+    order = np.ndarray((count,), dtype=np.intp, buffer=buffer, offset=orderOffset)
+    params = np.ndarray((_PARAM_SIZE,), dtype=np.float64, buffer=buffer,
+                        offset=orderOffset + count * np.dtype(np.intp).itemsize)
+    return arrays, order, params
+
+
+def _blockSize(count):
+    return count * (len(_ARRAY_NAMES) * 3 * 8 + np.dtype(np.intp).itemsize) + _PARAM_SIZE * 8
+
+
+def _packParams(params, values):
+    # the version in values[0] goes up last, once the fields are in place
+    values[1:1 + len(_PARAM_FIELDS)] = [getattr(params, field) for field in _PARAM_FIELDS]
+    values[1 + len(_PARAM_FIELDS):] = params.center
+    values[0] += 1
+
+
+def _unpackParams(values):
+    fields = dict(zip(_PARAM_FIELDS, values[1:1 + len(_PARAM_FIELDS)].tolist()))
+    return FlockParams(center=tuple(values[1 + len(_PARAM_FIELDS):].tolist()), **fields)
+
+
+def _attachWorker(name, count):
+    memory = shared_memory.SharedMemory(name=name)
+    arrays, order, params = _sharedArrays(memory.buf, count)
+    _worker['memory'] = memory
+    _worker['arrays'] = arrays
+    _worker['order'] = order
+    _worker['params'] = params
+    _worker['paramsVersion'] = None
+    _worker['flock'] = FlockState(arrays['positions'], arrays['velocities'], copy=False)
+
+
+def _workerParams():
+    values = _worker['params']
+    if _worker['paramsVersion'] != values[0]:
+        _worker['paramsVersion'] = values[0]
+        _worker['flockParams'] = _unpackParams(values)
+    return _worker['flockParams']
+
+
+def _stepTiles(task):
+    frame, start, stop = task
+    params = _workerParams()
+    arrays = _worker['arrays']
+    rows = _worker['order'][start:stop]
+    # the neighbour index covers the whole flock, build it once per frame for all tiles of this worker
+    rebuild = _worker.get('frame') != frame
+    _worker['frame'] = frame
+    stepped = _worker['flock'].stepRows(rows, params, rebuild=rebuild)
+    arrays['nextPositions'][rows] = stepped.positions
+    arrays['nextVelocities'][rows] = stepped.velocities
+    return stop - start
+
+
+class ParallelFlock(object):
+    """FlockState look-alike whose step() runs in a process pool; close() it when done"""
+
+    def __init__(self, positions, velocities, workers=None, tilesPerWorker=4, context='spawn'):
+        super(ParallelFlock, self).__init__()
+        count = len(positions)
+        self.workers = workers or multiprocessing.cpu_count()
+        self.tilesPerWorker = tilesPerWorker
+        self.stepTime = 0.0
+        self._frame = 0
+        self._params = None
+        self._memory = shared_memory.SharedMemory(create=True, size=_blockSize(count))
+        self._arrays, self._order, self._sharedParams = _sharedArrays(self._memory.buf, count)
+        self._sharedParams[0] = 0
+        self.positions = self._arrays['positions']
+        self.velocities = self._arrays['velocities']
+        self.positions[:] = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        self.velocities[:] = np.asarray(velocities, dtype=np.float64).reshape(-1, 3)
+        self._pool = multiprocessing.get_context(context).Pool(
+            self.workers, initializer=_attachWorker, initargs=(self._memory.name, count))
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _sortIntoTiles(self, cellSize):
+        cells = np.floor(self.positions / cellSizeFor(cellSize)).astype(np.int64)
+        self._order[:] = np.lexsort((cells[:, 2], cells[:, 1], cells[:, 0]))
+
+    def step(self, params):
+        start = default_timer()
+        count = len(self)
+        if params != self._params:
+            # written before the tasks go out, every worker sees the new version on this frame
+            _packParams(params, self._sharedParams)
+            self._params = params
+        self._sortIntoTiles(params.detectDistance)
+        tileCount = min(count, self.workers * self.tilesPerWorker) or 1
+        bounds = np.linspace(0, count, tileCount + 1).astype(int)
+        self._frame += 1
+        tasks = [(self._frame, int(first), int(last))
+                 for first, last in zip(bounds[:-1], bounds[1:]) if last > first]
+        self._pool.map(_stepTiles, tasks, chunksize=1)
+        self.positions[:] = self._arrays['nextPositions']
+        self.velocities[:] = self._arrays['nextVelocities']
+        self.stepTime = default_timer() - start
+
+    def close(self):
+        if self._pool is None:
+            return
+        self._pool.close()
+        self._pool.join()
+        self._pool = None
+        # drop the numpy views before closing, the buffer cannot be released while they exist
+        self._arrays = self._order = self._sharedParams = self.positions = self.velocities = None
+        self._memory.close()
+        self._memory.unlink()
+
+
+def benchmark(count=20000, workers=(1, 2, 4, 8, 16, 32), frames=5, seed=0):
+    """print the frame time and speedup over the serial FlockState for every worker count"""
+    params = FlockParams()
+    random = np.random.RandomState(seed)
+    radius = (count / 0.001) ** (1 / 3.0) / 2
+    positions = random.uniform(-radius, radius, (count, 3))
+    velocities = random.uniform(-1, 1, (count, 3))
+
+    serial = FlockState(positions, velocities)
+    start = default_timer()
+    for _ in range(frames):
+        serial.step(params)
+    serialTime = (default_timer() - start) / frames
+    print('{:>3} workers: {:.4f}s per frame (serial FlockState)'.format(0, serialTime))
+
+    for workerCount in workers:
+        if workerCount > multiprocessing.cpu_count():
+            break
+        with ParallelFlock(positions, velocities, workers=workerCount) as flock:
+            total = 0.0
+            for _ in range(frames):
+                flock.step(params)
+                total += flock.stepTime
+            identical = np.array_equal(flock.positions, serial.positions) and \
+                np.array_equal(flock.velocities, serial.velocities)
+            print('{:>3} workers: {:.4f}s per frame, speedup {:.2f}x, identical to serial: {}'.format(
+                workerCount, total / frames, serialTime * frames / total, identical))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,131 @@
+# coding = utf-8
+"""
+Maya-free Gerstner wave math shared by WaveSimulation and the batch runner.
+
+deform_point is the per-vertex reference. GerstnerWaves evaluates the same sum
+on a whole (N, 3) array, feeding each wave the points moved by the previous
+ones like the per-vertex `point +=` chain. Both follow the same order of float
+operations; they agree to 1e-12, the only difference being the last bit numpy
+and math may round cos / sin to.
+"""
+from timeit import default_timer
+import math
+
+import numpy as np
+
+# (flow direction, amplitude scale, frequency scale, speed scale) of every wave, summed in this order
+WAVES = (
+    ((0.47, 0.0, 0.35), 0.016, 0.8, 20),
+    ((-0.3, 0.0, -0.2), 0.036, 2.4, 30),
+    ((-0.96, 0.0, 0.23), 0.024, 3.6, 30),
+    ((0.77, 0.0, -1.47), 0.028, 2.0, 10),
+)
+
+
+def wave(point, flow_dir, amp, freq, time):
+    """general gerstner wave calculation, returns the offset added to point"""
+    length = math.sqrt(flow_dir[0] * flow_dir[0] + flow_dir[2] * flow_dir[2])
+    dx = flow_dir[0] / length
+    dz = flow_dir[2] / length
+    f = (point[0] * dx + point[2] * dz) * freq + time / 120
+    return amp * dx * math.cos(f), amp * math.sin(f), amp * dz * math.cos(f)
+
+
+def deform_point(point, time, amp, freq, spd):
+    """per vertex operation, every wave is evaluated on the point already moved by the previous ones"""
+    p = [point[0], point[1], point[2]]
+    for flow_dir, amp_scale, freq_scale, speed_scale in WAVES:
+        offset = wave(p, flow_dir, amp_scale * amp, freq_scale * freq, time * speed_scale * spd)
+        p[0] += offset[0]
+        p[1] += offset[1]
+        p[2] += offset[2]
+    return p
+
+
+class GerstnerWaves(object):
+    """summed gerstner waves for whole point arrays, per-wave constants are cached until a parameter changes"""
+
+    def __init__(self, amp=0.5, freq=0.5, spd=0.5):
+        self._amp = amp
+        self._freq = freq
+        self._spd = spd
+        self._scratch = {}
+        self._update()
+
+    def set_parameters(self, amp=None, freq=None, spd=None):
+        self._amp = self._amp if amp is None else amp
+        self._freq = self._freq if freq is None else freq
+        self._spd = self._spd if spd is None else spd
+        self._update()
+
+    def _update(self):
+        self._waves = []
+        for flow_dir, amp_scale, freq_scale, speed_scale in WAVES:
+            length = math.sqrt(flow_dir[0] * flow_dir[0] + flow_dir[2] * flow_dir[2])
+            dx = flow_dir[0] / length
+            dz = flow_dir[2] / length
+            amp = amp_scale * self._amp
+            # amp * d.x and amp * d.z are the leading products of wave(), so keeping them changes no rounding
+            self._waves.append((dx, dz, amp, amp * dx, amp * dz, freq_scale * self._freq, speed_scale))
+
+    def _buffer(self, name, count):
+        buffer = self._scratch.get(name)
+        if buffer is None or len(buffer) != count:
+            buffer = self._scratch[name] = np.empty(count)
+        return buffer
+
+    def deform(self, points, time, out=None):
+        """(N, 3) float64 deformed copy of points, written into out when given"""
+        points = np.asarray(points, dtype=np.float64)
+        out = np.array(points[:, :3]) if out is None else out
+        if out is not points:
+            out[:] = points[:, :3]
+        count = len(out)
+        f = self._buffer('f', count)
+        term = self._buffer('term', count)
+        for dx, dz, amp, amp_dx, amp_dz, freq, speed_scale in self._waves:
+            # f = (p . d) * freq + time / 120
+            np.multiply(out[:, 0], dx, out=f)
+            np.multiply(out[:, 2], dz, out=term)
+            f += term
+            f *= freq
+            f += time * speed_scale * self._spd / 120
+            np.sin(f, out=term)
+            term *= amp
+            np.cos(f, out=f)
+            out[:, 1] += term
+            np.multiply(f, amp_dx, out=term)
+            out[:, 0] += term
+            f *= amp_dz
+            out[:, 2] += f
+        return out
+
+
+def deform_points(points, time, amp, freq, spd):
+    """(N, 3) deformed copy of the (N, 3) rest points"""
+    return GerstnerWaves(amp, freq, spd).deform(points, time)
+
+
+def plane_points(width=20.0, height=20.0, subdivisions_width=10, subdivisions_height=10):
+    """rest points of cmds.polyPlane(w=width, h=height, sw=..., sh=...), in the same vertex order"""
+    x = np.linspace(-width / 2.0, width / 2.0, subdivisions_width + 1)
+    z = np.linspace(height / 2.0, -height / 2.0, subdivisions_height + 1)
+    grid_x, grid_z = np.meshgrid(x, z)
+    return np.stack([grid_x.ravel(), np.zeros(grid_x.size), grid_z.ravel()], axis=1)
+
+
+def benchmark(counts=(10000, 100000, 1000000), frames=10):
+    """print the seconds per frame of GerstnerWaves on planes of growing vertex count"""
+    waves = GerstnerWaves()
+    for count in counts:
+        side = int(math.sqrt(count)) - 1
+        rest = plane_points(100.0, 100.0, side, side)
+        out = np.empty_like(rest)
+        start = default_timer()
+        for frame in range(frames):
+            waves.deform(rest, frame, out=out)
+        print('{:>8} vertices: {:.4f}s per frame'.format(len(rest), (default_timer() - start) / frames))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,112 @@
+# coding = utf-8
+"""
+gerstnerWave deformer node (Python API 2.0) running the gerstner wave sum.
+
+    cmds.loadPlugin('.../3D_Math/Practice/gerstner_deformer.py')
+    node = cmds.deformer('WavePlane', type='gerstnerWave')[0]
+    cmds.connectAttr('time1.outTime', node + '.time')
+
+amplitude, frequency and speed are the WaveWidget sliders, time is read in
+frames of the current unit like the timeline WaveSimulation used to script.
+deform() hands all points of the geometry to one GerstnerWaves.deform call, so
+the node matches wave() and the scripted simulation, and blends the result
+with the envelope. Getting the points in and out of MItGeometry still costs a
+Python object per point, API 2.0 point arrays have no buffer to share. Being a
+regular deformer, the wave is evaluated by the DG or the evaluation manager
+and takes part in cached playback; painted weights are not read, evaluating
+them costs a Python call per vertex. The Practice folder has to be on the
+Python path like for the other scripts.
+"""
+import maya.api.OpenMaya as om
+import maya.api.OpenMayaAnim as oma
+
+import gerstner
+from MayaUtils.point_bridge import arrayToPoints
+from MayaUtils.point_bridge import pointsToArray
+
+
+def maya_useNewAPI():
+    """tells maya this plugin uses the Python API 2.0"""
+    pass
+
+
+# envelope and outputGeom moved to MPxGeometryFilter in Maya 2022
+_GEOMETRY_FILTER = getattr(oma, 'MPxGeometryFilter', oma.MPxDeformerNode)
+
+
+class GerstnerDeformer(oma.MPxDeformerNode):
+    kNodeName = 'gerstnerWave'
+    # local development range, not to be shipped outside the studio
+    kNodeId = om.MTypeId(0x0007F7A1)
+
+    amplitude = None
+    frequency = None
+    speed = None
+    time = None
+
+    def __init__(self):
+        super(GerstnerDeformer, self).__init__()
+        # keeps the per-wave constants and scratch buffers between evaluations
+        self._waves = gerstner.GerstnerWaves()
+        self._parameters = None
+
+    @staticmethod
+    def creator():
+        return GerstnerDeformer()
+
+    @staticmethod
+    def initialize():
+        numericAttr = om.MFnNumericAttribute()
+        for name, shortName in (('amplitude', 'amp'), ('frequency', 'frq'), ('speed', 'spd')):
+            attribute = numericAttr.create(name, shortName, om.MFnNumericData.kDouble, 0.5)
+            numericAttr.keyable = True
+            numericAttr.setMin(0.0)
+            setattr(GerstnerDeformer, name, attribute)
+
+        unitAttr = om.MFnUnitAttribute()
+        GerstnerDeformer.time = unitAttr.create('time', 'tm', om.MFnUnitAttribute.kTime, 0.0)
+        unitAttr.keyable = True
+
+        for attribute in (GerstnerDeformer.amplitude, GerstnerDeformer.frequency,
+                          GerstnerDeformer.speed, GerstnerDeformer.time):
+            GerstnerDeformer.addAttribute(attribute)
+            GerstnerDeformer.attributeAffects(attribute, _GEOMETRY_FILTER.outputGeom)
+
+    def deform(self, dataBlock, geoIter, matrix, multiIndex):
+        envelope = dataBlock.inputValue(_GEOMETRY_FILTER.envelope).asFloat()
+        if envelope == 0.0:
+            return
+        parameters = (dataBlock.inputValue(GerstnerDeformer.amplitude).asDouble(),
+                      dataBlock.inputValue(GerstnerDeformer.frequency).asDouble(),
+                      dataBlock.inputValue(GerstnerDeformer.speed).asDouble())
+        if parameters != self._parameters:
+            self._parameters = parameters
+            self._waves.set_parameters(*parameters)
+        time = dataBlock.inputValue(GerstnerDeformer.time).asTime().asUnits(om.MTime.uiUnit())
+
+        points = pointsToArray(geoIter.allPositions())
+        deformed = self._waves.deform(points, time)
+        if envelope != 1.0:
+            deformed -= points
+            deformed *= envelope
+            deformed += points
+        geoIter.setAllPositions(arrayToPoints(deformed))
+
+
+def initializePlugin(plugin):
+    pluginFn = om.MFnPlugin(plugin, 'MayaPy-Lab', '1.0')
+    try:
+        pluginFn.registerNode(GerstnerDeformer.kNodeName, GerstnerDeformer.kNodeId, GerstnerDeformer.creator,
+                              GerstnerDeformer.initialize, om.MPxNode.kDeformerNode)
+    except RuntimeError:
+        om.MGlobal.displayError('Failed to register node: {}'.format(GerstnerDeformer.kNodeName))
+        raise
+
+
+def uninitializePlugin(plugin):
+    pluginFn = om.MFnPlugin(plugin)
+    try:
+        pluginFn.deregisterNode(GerstnerDeformer.kNodeId)
+    except RuntimeError:
+        om.MGlobal.displayError('Failed to deregister node: {}'.format(GerstnerDeformer.kNodeName))
+        raise
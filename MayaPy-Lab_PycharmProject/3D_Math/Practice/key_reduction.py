@@ -0,0 +1,100 @@
+"""
+Sparse keys for baked per-vertex animation.
+
+reduceKeys takes (F, ...) values sampled at F times, for example the (F, N, 3)
+points of a squash or wave bake, and keeps per channel only the keys linear
+interpolation needs to stay within tolerance of every sample. It is
+Douglas-Peucker run on all channels at once: every pass interpolates between
+the keys kept so far and adds, in each segment still off by more than the
+tolerance, the sample furthest from the line. First and last keys are always
+kept, a channel that never leaves the tolerance around its first value keeps
+that key only and is reported as static.
+
+    reduction = reduceKeys(times, baked, tolerance=1e-2)
+    print(reduction)          # 3600000 -> 177160 keys (20.3x), 2 static channels, max error 0.00999998
+    reduction.channel(12)     # (times, values) of the keys kept on channel 12
+
+Written as linear tangent keys, the curves reproduce every sample to maxError.
+"""
+from __future__ import division
+
+import numpy as np
+
+
+class KeyReduction(object):
+    """kept keys of (F, C) values, C the flattened trailing axes of the original (F, ...) shape"""
+
+    def __init__(self, times, values, keep, static, shape):
+        super(KeyReduction, self).__init__()
+        self.times = times
+        self.values = values
+        self.keep = keep
+        self.static = static
+        self.shape = shape
+        self.maxError = float(np.abs(interpolateKeys(times, values, keep) - values).max()) if values.size else 0.0
+
+    @property
+    def originalKeys(self):
+        return self.values.size
+
+    @property
+    def keptKeys(self):
+        return int(self.keep.sum())
+
+    @property
+    def ratio(self):
+        """original keys per kept key"""
+        return self.originalKeys / max(self.keptKeys, 1)
+
+    def channel(self, index):
+        """(times, values) of the kept keys of one channel"""
+        keep = self.keep[:, index]
+        return self.times[keep], self.values[keep, index]
+
+    def __str__(self):
+        return '{} -> {} keys ({:.1f}x), {} static channels, max error {:.6g}'.format(
+            self.originalKeys, self.keptKeys, self.ratio, int(self.static.sum()), self.maxError)
+
+
+def interpolateKeys(times, values, keep):
+    """(F, C) linear interpolation of the kept keys of every channel at every time"""
+    frames = np.arange(len(times))[:, None]
+    previous = np.maximum.accumulate(np.where(keep, frames, 0), axis=0)
+    following = np.minimum.accumulate(np.where(keep, frames, len(times))[::-1], axis=0)[::-1]
+    # past the last kept key of a channel, for static channels, the value holds
+    following = np.where(following == len(times), previous, following)
+    channels = np.arange(values.shape[1])[None]
+    start, end = values[previous, channels], values[following, channels]
+    span = times[following] - times[previous]
+    weight = np.divide(times[:, None] - times[previous], span, out=np.zeros(span.shape), where=span > 0)
+    return start + (end - start) * weight
+
+
+def reduceKeys(times, values, tolerance=1e-3):
+    """KeyReduction of (F, ...) values keyed at F times, within tolerance on every sample"""
+    times = np.asarray(times, dtype=np.float64)
+    shape = np.shape(values)
+    values = np.asarray(values, dtype=np.float64).reshape(len(times), int(np.prod(shape[1:])))
+    frameCount, channelCount = values.shape
+    keep = np.zeros(values.shape, dtype=bool)
+    if frameCount == 0 or channelCount == 0:
+        return KeyReduction(times, values, keep, np.zeros(channelCount, dtype=bool), shape)
+
+    keep[0] = True
+    static = (np.abs(values - values[0]) <= tolerance).all(axis=0)
+    keep[-1] |= ~static
+    # only the channels that still gained keys in the last pass are looked at again
+    active = np.flatnonzero(~static)
+    while len(active):
+        activeKeep = keep[:, active]
+        error = np.abs(interpolateKeys(times, values[:, active], activeKeep) - values[:, active])
+        # channel major, every run from a kept key to the next one is a segment
+        error = error.T.ravel()
+        starts = np.flatnonzero(activeKeep.T.ravel())
+        segmentMax = np.maximum.reduceat(error, starts)
+        worst = (error == np.repeat(segmentMax, np.diff(np.append(starts, error.size)))) & (error > tolerance)
+        worst = worst.reshape(len(active), frameCount).T
+        keep[:, active] = activeKeep | worst
+        active = active[worst.any(axis=0)]
+
+    return KeyReduction(times, values, keep, static, shape)
@@ -0,0 +1,61 @@
+# coding = utf-8
+"""
+sceneBackendModifier command (Python API 2.0) that does an MDGModifier as an undoable step.
+
+MayaBackend queues the modifier of a write with scene_backend and calls the
+command, which takes it off the queue, does it and keeps it for undo / redo, so
+the plug values of a write-back land in the same undo chunk as its keyframes.
+The plugin is loaded by MayaBackend on first use; the Practice folder has to
+be on the Python path like for the other scripts.
+"""
+import maya.api.OpenMaya as om
+
+import scene_backend
+
+
+def maya_useNewAPI():
+    """tells maya this plugin uses the Python API 2.0"""
+    pass
+
+
+class ModifierCommand(om.MPxCommand):
+    kCommandName = 'sceneBackendModifier'
+
+    def __init__(self):
+        super(ModifierCommand, self).__init__()
+        self._modifier = None
+
+    @staticmethod
+    def creator():
+        return ModifierCommand()
+
+    def isUndoable(self):
+        return True
+
+    def doIt(self, args):
+        self._modifier = scene_backend.takePendingModifier()
+        self.redoIt()
+
+    def redoIt(self):
+        self._modifier.doIt()
+
+    def undoIt(self):
+        self._modifier.undoIt()
+
+
+def initializePlugin(plugin):
+    pluginFn = om.MFnPlugin(plugin, 'MayaPy-Lab', '1.0')
+    try:
+        pluginFn.registerCommand(ModifierCommand.kCommandName, ModifierCommand.creator)
+    except RuntimeError:
+        om.MGlobal.displayError('Failed to register command: {}'.format(ModifierCommand.kCommandName))
+        raise
+
+
+def uninitializePlugin(plugin):
+    pluginFn = om.MFnPlugin(plugin)
+    try:
+        pluginFn.deregisterCommand(ModifierCommand.kCommandName)
+    except RuntimeError:
+        om.MGlobal.displayError('Failed to deregister command: {}'.format(ModifierCommand.kCommandName))
+        raise
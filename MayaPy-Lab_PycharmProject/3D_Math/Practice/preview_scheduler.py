@@ -0,0 +1,130 @@
+"""
+Timer driven preview loop for the wave and boid tools.
+
+A QTimer ticks at the target frame rate on the main thread. The simulation
+step of the next frame runs in a single worker thread while the main thread
+stays free for the UI; a tick whose step has finished hands the result to the
+write callback, the only place that may touch the scene, and queues the
+following step. Frames are numbered from the wall clock, so when a step or
+write takes longer than a frame the frames in between are dropped instead of
+queued, and a stopped preview stops at the next tick.
+
+    scheduler = PreviewScheduler(step, write, fps=24)
+    scheduler.start(startFrame)
+
+step(frame) must not use maya.cmds or OpenMaya, write(frame, result) runs on
+the main thread. With snapshot, step(frame, state) gets the value snapshot()
+returned on the main thread when the step was queued, so the worker never
+reads parameters the UI is changing. stats() reports the achieved frame rate, the dropped frames
+and the step / write latency percentiles in seconds.
+"""
+from __future__ import division
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from timeit import default_timer
+
+import numpy as np
+
+from Qt import QtCore
+
+
+class PreviewScheduler(QtCore.QObject):
+    finished = QtCore.Signal()
+
+    def __init__(self, step, write, fps=24.0, frames=-1, history=500, snapshot=None, parent=None):
+        super(PreviewScheduler, self).__init__(parent)
+        self.step = step
+        self.write = write
+        self.snapshot = snapshot
+        self.fps = fps
+        # number of frames written before the preview stops by itself, -1 plays until stop()
+        self.frames = frames
+        self.writtenFrames = 0
+        self.droppedFrames = 0
+        self._stepTimes = deque(maxlen=history)
+        self._writeTimes = deque(maxlen=history)
+        self._executor = None
+        self._future = None
+        self._startFrame = 0
+        self._lastFrame = 0
+        self._startTime = 0.0
+        self._stopTime = None
+        self._timer = QtCore.QTimer(self)
+        self._timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self._timer.timeout.connect(self._tick)
+
+    def isRunning(self):
+        return self._timer.isActive()
+
+    def start(self, startFrame=0):
+        if self.isRunning():
+            return
+        self.writtenFrames = 0
+        self.droppedFrames = 0
+        self._stepTimes.clear()
+        self._writeTimes.clear()
+        self._startFrame = self._lastFrame = startFrame
+        self._startTime = default_timer()
+        self._stopTime = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._submit(startFrame + 1)
+        self._timer.start(max(1, int(round(1000.0 / self.fps))))
+
+    def stop(self):
+        if self._executor is None:
+            return
+        self._timer.stop()
+        # let a step in flight finish so the simulation state is consistent, its result is dropped
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        self._future = None
+        self._stopTime = default_timer()
+        self.finished.emit()
+
+    def _timedStep(self, frame, state):
+        start = default_timer()
+        result = self.step(frame) if self.snapshot is None else self.step(frame, state)
+        return frame, result, default_timer() - start
+
+    def _submit(self, frame):
+        self.droppedFrames += frame - self._lastFrame - 1
+        self._lastFrame = frame
+        state = None if self.snapshot is None else self.snapshot()
+        self._future = self._executor.submit(self._timedStep, frame, state)
+
+    def _tick(self):
+        if self._future is None or not self._future.done():
+            return
+        try:
+            frame, result, stepTime = self._future.result()
+            start = default_timer()
+            self.write(frame, result)
+        except Exception:
+            self.stop()
+            raise
+        self._writeTimes.append(default_timer() - start)
+        self._stepTimes.append(stepTime)
+        self.writtenFrames += 1
+        if 0 < self.frames <= self.writtenFrames:
+            self.stop()
+            return
+        dueFrame = self._startFrame + 1 + int((default_timer() - self._startTime) * self.fps)
+        self._submit(max(dueFrame, frame + 1))
+
+    @staticmethod
+    def _percentiles(times):
+        if not times:
+            return {'p50': 0.0, 'p90': 0.0, 'p99': 0.0}
+        p50, p90, p99 = np.percentile(np.array(times), (50, 90, 99))
+        return {'p50': p50, 'p90': p90, 'p99': p99}
+
+    def stats(self):
+        elapsed = (self._stopTime or default_timer()) - self._startTime
+        return {
+            'targetFps': self.fps,
+            'fps': self.writtenFrames / elapsed if elapsed > 0 else 0.0,
+            'writtenFrames': self.writtenFrames,
+            'droppedFrames': self.droppedFrames,
+            'stepLatency': self._percentiles(self._stepTimes),
+            'writeLatency': self._percentiles(self._writeTimes),
+        }
@@ -0,0 +1,291 @@
+"""
+Scene backends the boid and wave simulations read from and write to in bulk.
+
+MayaBackend talks to a live scene: plug values go through one MDGModifier per
+call, done by the undoable sceneBackendModifier command of modifier_command.py,
+keyframes through one cmds.setKeyframe per call and baked channels through one
+MFnAnimCurve.addKeys per curve, given a tolerance only with the keys
+key_reduction keeps. The cmds, OpenMaya and OpenMayaAnim modules can be
+swapped for fakes to count the calls that reach them. A write-back is one undo
+step; the curves of a bake are written outside any command and stay when it is
+undone, cut the keys to remove a bake.
+RecordingBackend keeps everything in memory and counts its calls, so the
+write-back can be timed and checked without Maya. Its save() dumps every curve
+and point cache into one NPZ file keyed by "node|attribute|times/values".
+"""
+from __future__ import division
+from collections import Counter
+from contextlib import contextmanager
+from timeit import default_timer
+import os
+
+import numpy as np
+
+from key_reduction import reduceKeys
+
+# modifiers queued for the sceneBackendModifier command, see modifier_command.py
+_pendingModifiers = []
+
+
+def takePendingModifier():
+    """the oldest modifier MayaBackend queued for the command"""
+    return _pendingModifiers.pop(0)
+
+
+class MayaBackend(object):
+    def __init__(self, cmds=None, om=None, oma=None):
+        super(MayaBackend, self).__init__()
+        if cmds is None:
+            import maya.cmds as cmds
+        if om is None:
+            import maya.api.OpenMaya as om
+        if oma is None:
+            import maya.api.OpenMayaAnim as oma
+        self.cmds = cmds
+        self.om = om
+        self.oma = oma
+        self._plugs = {}
+        self._modifierCommand = None
+
+    @contextmanager
+    def writeChunk(self, name):
+        # groups the commands of one write (cutKey, setKeyframe, sceneBackendModifier) into one undo step,
+        # the MFnAnimCurve curves of a bake stay out of the undo queue
+        self.cmds.undoInfo(openChunk=True, chunkName=name)
+        try:
+            yield
+        finally:
+            self.cmds.undoInfo(closeChunk=True)
+
+    def _doModifier(self, modifier):
+        """do modifier through the sceneBackendModifier command, so undo reverts it"""
+        if self._modifierCommand is None:
+            import modifier_command
+
+            plugin = os.path.splitext(modifier_command.__file__)[0] + '.py'
+            if not self.cmds.pluginInfo(os.path.basename(plugin), query=True, loaded=True):
+                self.cmds.loadPlugin(plugin)
+            self._modifierCommand = getattr(self.cmds, modifier_command.ModifierCommand.kCommandName)
+        _pendingModifiers.append(modifier)
+        try:
+            self._modifierCommand()
+        except Exception:
+            # a command that failed before taking it must not hand it to the next call
+            if modifier in _pendingModifiers:
+                _pendingModifiers.remove(modifier)
+            raise
+
+    def _childPlugs(self, names, attribute):
+        missing = [name for name in names if (name, attribute) not in self._plugs]
+        if missing:
+            selection = self.om.MSelectionList()
+            for name in missing:
+                selection.add(name)
+            for i, name in enumerate(missing):
+                node = self.om.MFnDependencyNode(selection.getDependNode(i))
+                plug = node.findPlug(attribute, False)
+                self._plugs[(name, attribute)] = [plug.child(k) for k in range(3)]
+        return [self._plugs[(name, attribute)] for name in names]
+
+    def getDouble3(self, names, attribute):
+        """(N, 3) values of a double3 attribute on every node"""
+        from MayaUtils.mesh_io import getPlugValues
+
+        return getPlugValues(names, attribute).reshape(-1, 3)
+
+    def setDouble3(self, names, attribute, values):
+        modifier = self.om.MDGModifier()
+        for plugs, value in zip(self._childPlugs(names, attribute), values.tolist()):
+            for plug, component in zip(plugs, value):
+                modifier.newPlugValueDouble(plug, component)
+        self._doModifier(modifier)
+
+    def setKeyframes(self, attributes, time=None):
+        if time is None:
+            self.cmds.setKeyframe(attributes)
+        else:
+            self.cmds.setKeyframe(attributes, time=time)
+
+    def setAnimCurves(self, names, attribute, times, values, curveType='linear'):
+        """replace the animation of a double3 attribute with one curve per channel, keyed at every time"""
+        self.cmds.cutKey(names, attribute=attribute, clear=True)
+        curveTypes = {
+            'linear': self.oma.MFnAnimCurve.kAnimCurveTL,
+            'unitless': self.oma.MFnAnimCurve.kAnimCurveTU,
+        }
+        unit = self.om.MTime.uiUnit()
+        timeArray = self.om.MTimeArray([self.om.MTime(time, unit) for time in times])
+        for i, plugs in enumerate(self._childPlugs(names, attribute)):
+            for k, plug in enumerate(plugs):
+                curve = self.oma.MFnAnimCurve()
+                curve.create(plug, curveTypes[curveType])
+                curve.addKeys(timeArray, self.om.MDoubleArray(values[:, i, k].tolist()))
+
+    def _meshPath(self, mesh):
+        selection = self.om.MSelectionList()
+        selection.add(mesh)
+        return selection.getDagPath(0).extendToShape()
+
+    def getPoints(self, mesh):
+        """(N, 3) object space points of a mesh, read from its raw vertex buffer"""
+        from MayaUtils.mesh_io import getMesh
+
+        return getMesh(mesh).getPoints(self.om.MSpace.kObject)
+
+    def getRestPoints(self, mesh):
+        """
+        (N, 3) object space points of a mesh without its pnts tweaks, the points setPointAnimation keys from
+        keyed tweaks are read at the current time, like the points, so earlier bakes do not add up
+        """
+        points = self.getPoints(mesh)
+        if not len(points):
+            return points
+        tweaks = self.cmds.getAttr('{}.pnts[0:{}]'.format(self._meshPath(mesh).fullPathName(), len(points) - 1))
+        return points - np.array(tweaks, dtype=np.float64).reshape(-1, 3)
+
+    def setPointAnimation(self, mesh, times, points, tolerance=None):
+        """
+        key the (F, N, 3) points of a mesh as offsets from its rest points on its pnts tweaks, one curve per channel
+        with a tolerance only the linear keys reduceKeys keeps are written and its KeyReduction is returned,
+        static channels get their value instead of a curve
+        """
+        shape = self._meshPath(mesh)
+        offsets = points - self.getRestPoints(mesh)[None]
+        self.cmds.cutKey(shape.fullPathName(), attribute='pnts', clear=True)
+        unit = self.om.MTime.uiUnit()
+        tweaks = self.om.MFnDependencyNode(shape.node()).findPlug('pnts', False)
+        if tolerance is None:
+            timeArray = self.om.MTimeArray([self.om.MTime(time, unit) for time in times])
+            for i in range(offsets.shape[1]):
+                tweak = tweaks.elementByLogicalIndex(i)
+                for k in range(3):
+                    curve = self.oma.MFnAnimCurve()
+                    curve.create(tweak.child(k), self.oma.MFnAnimCurve.kAnimCurveTL)
+                    curve.addKeys(timeArray, self.om.MDoubleArray(offsets[:, i, k].tolist()))
+            return None
+
+        reduction = reduceKeys(times, offsets, tolerance)
+        linear = self.oma.MFnAnimCurve.kTangentLinear
+        modifier = self.om.MDGModifier()
+        for channel in range(reduction.values.shape[1]):
+            plug = tweaks.elementByLogicalIndex(channel // 3).child(channel % 3)
+            keyTimes, keyValues = reduction.channel(channel)
+            if reduction.static[channel]:
+                modifier.newPlugValueDouble(plug, float(keyValues[0]))
+                continue
+            curve = self.oma.MFnAnimCurve()
+            curve.create(plug, self.oma.MFnAnimCurve.kAnimCurveTL)
+            curve.addKeys(self.om.MTimeArray([self.om.MTime(time, unit) for time in keyTimes.tolist()]),
+                          self.om.MDoubleArray(keyValues.tolist()), linear, linear)
+        self._doModifier(modifier)
+        return reduction
+
+
+class RecordingBackend(object):
+    def __init__(self):
+        super(RecordingBackend, self).__init__()
+        self.calls = Counter()
+        self.values = {}
+        self.keyframes = []
+        self.curves = {}
+        self.reductions = {}
+        # rest points of the meshes getPoints can read
+        self.points = {}
+
+    @contextmanager
+    def writeChunk(self, name):
+        self.calls['writeChunk'] += 1
+        yield
+
+    def getDouble3(self, names, attribute):
+        self.calls['getDouble3'] += 1
+        return np.array([self.values.get((name, attribute), (0.0, 0.0, 0.0)) for name in names], dtype=np.float64)
+
+    def setDouble3(self, names, attribute, values):
+        self.calls['setDouble3'] += 1
+        for name, value in zip(names, values.tolist()):
+            self.values[(name, attribute)] = tuple(value)
+
+    def setKeyframes(self, attributes, time=None):
+        self.calls['setKeyframes'] += 1
+        self.keyframes.append((time, list(attributes)))
+
+    def setAnimCurves(self, names, attribute, times, values, curveType='linear'):
+        self.calls['setAnimCurves'] += 1
+        for i, name in enumerate(names):
+            self.curves[(name, attribute)] = (np.array(times, dtype=np.float64), values[:, i].copy())
+
+    def getPoints(self, mesh):
+        self.calls['getPoints'] += 1
+        return self.points[mesh].copy()
+
+    def getRestPoints(self, mesh):
+        # recorded meshes carry no tweaks
+        return self.getPoints(mesh)
+
+    def setPointAnimation(self, mesh, times, points, tolerance=None):
+        self.calls['setPointAnimation'] += 1
+        self.curves[(mesh, 'pnts')] = (np.array(times, dtype=np.float64), np.array(points, dtype=np.float64))
+        if tolerance is None:
+            return None
+        # a constant rest offset does not change which keys are kept
+        self.reductions[mesh] = reduceKeys(times, points, tolerance)
+        return self.reductions[mesh]
+
+    def save(self, path):
+        arrays = {}
+        for (node, attribute), (times, values) in self.curves.items():
+            arrays['{}|{}|times'.format(node, attribute)] = times
+            arrays['{}|{}|values'.format(node, attribute)] = values
+        np.savez(path, **arrays)
+
+
+class BoidWriteBack(object):
+    """
+    gathers the boid states of a frame and flushes them with a constant number of backend calls
+    on a MayaBackend a flush, values and keyframes, is a single undo step
+    """
+
+    def __init__(self, names, backend):
+        super(BoidWriteBack, self).__init__()
+        self.names = list(names)
+        self.backend = backend
+        self.flushTime = 0.0
+        self._translateAttributes = ['{}.translate'.format(name) for name in self.names]
+        self._positions = None
+        self._velocities = None
+
+    def gather(self, flock):
+        self._positions = flock.positions.copy()
+        self._velocities = flock.velocities.copy()
+
+    def flush(self, keyframe=False, time=None):
+        if self._positions is None:
+            return
+        start = default_timer()
+        with self.backend.writeChunk('boidWriteBack'):
+            self.backend.setDouble3(self.names, 'translate', self._positions)
+            self.backend.setDouble3(self.names, 'velocity', self._velocities)
+            if keyframe:
+                self.backend.setKeyframes(self._translateAttributes, time=time)
+        self._positions = None
+        self._velocities = None
+        self.flushTime = default_timer() - start
+
+
+def bakeFlock(flock, names, backend, frames, startTime, params):
+    """
+    simulate every frame in memory first, then write one curve per boid channel
+    the current time is never changed, frame k is keyed at startTime + k like the interactive simulation
+    on a MayaBackend undo only reverts the velocities, cut the translate keys to remove the bake
+    """
+    positions = np.empty((frames, len(flock), 3))
+    for frame in range(frames):
+        flock.step(params)
+        positions[frame] = flock.positions
+    times = startTime + np.arange(frames)
+    with backend.writeChunk('boidBake'):
+        backend.setAnimCurves(names, 'translate', times, positions)
+        # leave the last velocities on the boids so a later run carries on from the bake
+        backend.setDouble3(names, 'velocity', flock.velocities)
+    return positions
@@ -0,0 +1,158 @@
+"""
+Rebuildable neighbour indices for the flock.
+
+Both indices are rebuilt every frame from the (N, 3) positions and return every
+ordered pair (row, col), row != col, whose distance is <= radius. Pairs come
+back sorted by row then col, the same order as the dense search in flock.py, so
+sums over neighbours stay bit-identical whichever index produced them.
+pairs() can be limited to some rows; the returned rows are then positions in
+that subset while cols stay indices into the whole flock.
+buildTime and queryTime hold the seconds spent by the last build / pairs call.
+"""
+from __future__ import division
+from timeit import default_timer
+import itertools
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+
+def _expandRanges(starts, counts):
+    # concatenate range(starts[i], starts[i] + counts[i]) for every i without a python loop
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.intp)
+    firsts = np.cumsum(counts) - counts
+    return np.repeat(starts - firsts, counts) + np.arange(total)
+
+
+def cellSizeFor(radius):
+    """grid cell size serving queries up to radius, a zero radius only finds boids sharing a position"""
+    return radius if radius > 0 else 1.0
+
+
+def _sortedPairs(rows, cols, count):
+    # sorting one combined key is much cheaper than a lexsort over two columns
+    keys = np.sort(rows.astype(np.int64) * count + cols)
+    return (keys // count).astype(np.intp), (keys % count).astype(np.intp)
+
+
+class UniformGrid(object):
+    """uniform grid hashed on cells of cellSize, queried through the 27 surrounding cells"""
+
+    def __init__(self):
+        super(UniformGrid, self).__init__()
+        self.buildTime = 0.0
+        self.queryTime = 0.0
+        self._positions = None
+        self._cellSize = None
+
+    def build(self, positions, cellSize):
+        start = default_timer()
+        if cellSize <= 0:
+            raise ValueError('UniformGrid needs a positive cell size.')
+        self._positions = positions
+        self._cellSize = cellSize
+        cells = np.floor(positions / cellSize).astype(np.int64)
+        # one empty cell of padding on each side so neighbour offsets never wrap to the next row of cells
+        cells -= cells.min(axis=0) - 1 if len(cells) else 0
+        self._dims = cells.max(axis=0) + 2 if len(cells) else np.ones(3, dtype=np.int64)
+        self._keys = (cells[:, 0] * self._dims[1] + cells[:, 1]) * self._dims[2] + cells[:, 2]
+        self._order = np.argsort(self._keys, kind='stable')
+        self._sortedKeys = self._keys[self._order]
+        self.buildTime = default_timer() - start
+
+    def pairs(self, radius, rows=None):
+        start = default_timer()
+        if radius > self._cellSize:
+            raise ValueError('UniformGrid can only be queried up to its cell size.')
+        positions = self._positions
+        queried = np.arange(len(positions)) if rows is None else np.asarray(rows, dtype=np.intp)
+        queriedKeys = self._keys[queried]
+        indices = np.arange(len(queried))
+        rows = []
+        cols = []
+        for dx, dy, dz in itertools.product((-1, 0, 1), repeat=3):
+            keys = queriedKeys + (dx * self._dims[1] + dy) * self._dims[2] + dz
+            first = np.searchsorted(self._sortedKeys, keys, side='left')
+            last = np.searchsorted(self._sortedKeys, keys, side='right')
+            counts = last - first
+            rows.append(np.repeat(indices, counts))
+            cols.append(self._order[_expandRanges(first, counts)])
+        rows = np.concatenate(rows)
+        cols = np.concatenate(cols)
+        offsets = positions[queried[rows]] - positions[cols]
+        keep = (queried[rows] != cols) & (np.einsum('ij,ij->i', offsets, offsets) <= radius * radius)
+        result = _sortedPairs(rows[keep], cols[keep], len(positions))
+        self.queryTime = default_timer() - start
+        return result
+
+
+class KDTreeIndex(object):
+    """scipy KD-tree, for flocks whose density is very uneven"""
+
+    def __init__(self):
+        super(KDTreeIndex, self).__init__()
+        if cKDTree is None:
+            raise ImportError('KDTreeIndex needs scipy.')
+        self.buildTime = 0.0
+        self.queryTime = 0.0
+        self._tree = None
+
+    def build(self, positions, cellSize=None):
+        start = default_timer()
+        self._tree = cKDTree(positions)
+        self.buildTime = default_timer() - start
+
+    def pairs(self, radius, rows=None):
+        start = default_timer()
+        if rows is None:
+            halfPairs = self._tree.query_pairs(radius, output_type='ndarray')
+            pairRows = np.concatenate([halfPairs[:, 0], halfPairs[:, 1]]).astype(np.intp)
+            cols = np.concatenate([halfPairs[:, 1], halfPairs[:, 0]]).astype(np.intp)
+        else:
+            queried = np.asarray(rows, dtype=np.intp)
+            hits = self._tree.query_ball_point(self._tree.data[queried], radius)
+            counts = np.array([len(hit) for hit in hits], dtype=np.intp)
+            pairRows = np.repeat(np.arange(len(queried)), counts)
+            cols = np.concatenate([np.zeros(0, dtype=np.intp)] + [np.asarray(hit, dtype=np.intp) for hit in hits])
+            keep = queried[pairRows] != cols
+            pairRows = pairRows[keep]
+            cols = cols[keep]
+        result = _sortedPairs(pairRows, cols, self._tree.n)
+        self.queryTime = default_timer() - start
+        return result
+
+
+def benchmark(counts=(100, 1000, 5000, 10000, 50000), detectDistance=15.0, density=0.001, frames=3):
+    """print per-frame build / query / cone timings of a flock stepped with each index"""
+    from flock import FlockParams
+    from flock import FlockState
+
+    backends = [('grid', UniformGrid)]
+    if cKDTree is not None:
+        backends.append(('kdtree', KDTreeIndex))
+    params = FlockParams(detectDistance=detectDistance)
+    random = np.random.RandomState(0)
+    for count in counts:
+        # keep the average number of boids per unit volume constant while the flock grows
+        radius = (count / density) ** (1 / 3.0) / 2
+        positions = random.uniform(-radius, radius, (count, 3))
+        velocities = random.uniform(-1, 1, (count, 3))
+        for name, indexClass in backends:
+            flock = FlockState(positions, velocities, neighbourIndex=indexClass())
+            totals = dict.fromkeys(('build', 'query', 'cone'), 0.0)
+            for _ in range(frames):
+                flock.neighbours(params)
+                for phase in totals:
+                    totals[phase] += flock.timings[phase]
+            print('{:>6} boids {:>6}: build {:.4f}s  query {:.4f}s  cone {:.4f}s'.format(
+                count, name, totals['build'] / frames, totals['query'] / frames, totals['cone'] / frames))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,81 @@
+# coding = utf-8
+"""
+Maya-free squash and stretch math of vertex_animation.
+
+Per frame the deformer scales by (sx * h, sy, sx * h) and then moves up by ty,
+where only h = 1 - cos(3.14 * |y|) * (t - 0.5) * 0.5 depends on the vertex.
+squash_curve evaluates (sx, sy, ty, t) for a whole frame range once, and
+SquashDeformer applies them to full point arrays, one frame or a whole bake at
+a time. deform_point is the per-vertex reference, it matches the
+MTransformationMatrix version to rounding.
+"""
+from timeit import default_timer
+import math
+
+import numpy as np
+
+
+def squash_curve(frames):
+    """(sx, sy, ty, t) arrays of the given frames"""
+    time = np.asarray(frames, dtype=np.float64)
+    time = np.where(time < 90, time, 180 - time)
+    # construct translate
+    th = np.where(time < 60, 0.0, time / 30.0 - 2)
+    ty = (1 - (1 - th) * (1 - th)) * 3
+    # t = 0.5: original, t = 0: squash, t = 1: squeeze; t: 0.5 ~ 0, frame 0-30; t: 0 ~ 1, frame 30 - 90
+    t = np.where(time < 30, 0.5 - time / 60.0, time / 60.0 - 0.5)
+    sy = t + 0.5
+    sx = 1.5 - t
+    return sx, sy, ty, t
+
+
+def deform_point(time, point):
+    """per vertex reference, point is anything with x, y, z"""
+    (sx,), (sy,), (ty,), (t,) = squash_curve([time])
+    h_scale = -math.cos(3.14 * abs(point.y)) * (t - 0.5) * 0.5 + 1
+    return [point.x * sx * h_scale, point.y * sy + ty, point.z * sx * h_scale]
+
+
+class SquashDeformer(object):
+    """squash and stretch of (N, 3) rest points, the per-frame curve is computed once for the frame range"""
+
+    def __init__(self, points, frames):
+        self.points = np.asarray(points, dtype=np.float64)[:, :3]
+        self.frames = np.asarray(frames)
+        self.sx, self.sy, self.ty, self.t = squash_curve(self.frames)
+        # the only per-vertex term, cos(3.14 * |y|) of the rest points
+        self._cos_y = np.cos(3.14 * np.abs(self.points[:, 1]))
+        self._index = dict((frame, i) for i, frame in enumerate(self.frames.tolist()))
+
+    def deform(self, frame, out=None):
+        """(N, 3) points of one frame of the range"""
+        i = self._index[frame]
+        out = np.empty_like(self.points) if out is None else out
+        horizontal = (1 - self._cos_y * ((self.t[i] - 0.5) * 0.5)) * self.sx[i]
+        np.multiply(self.points[:, 0], horizontal, out=out[:, 0])
+        np.multiply(self.points[:, 1], self.sy[i], out=out[:, 1])
+        out[:, 1] += self.ty[i]
+        np.multiply(self.points[:, 2], horizontal, out=out[:, 2])
+        return out
+
+    def bake(self):
+        """(F, N, 3) points of every frame of the range in one batched operation"""
+        horizontal = (1 - self._cos_y[None] * ((self.t[:, None] - 0.5) * 0.5)) * self.sx[:, None]
+        baked = np.empty((len(self.frames),) + self.points.shape)
+        baked[:, :, 0] = self.points[None, :, 0] * horizontal
+        baked[:, :, 1] = self.points[None, :, 1] * self.sy[:, None] + self.ty[:, None]
+        baked[:, :, 2] = self.points[None, :, 2] * horizontal
+        return baked
+
+
+def benchmark(count=100000, frames=120):
+    """print the seconds of a whole bake of count points"""
+    random = np.random.RandomState(0)
+    deformer = SquashDeformer(random.uniform(-1, 1, (count, 3)), range(frames))
+    start = default_timer()
+    deformer.bake()
+    print('{} points x {} frames: {:.4f}s'.format(count, frames, default_timer() - start))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,47 @@
+import numpy as np
+
+from flock import angledDetector
+from flock import Boid
+from flock import FlockParams
+from flock import FlockState
+from flock import Vec3
+
+
+def stepPerBoid(positions, velocities, params):
+    """one frame of the per-boid rules, every boid reading the frozen start-of-frame flock"""
+    frozen = FlockState(positions, velocities)
+    moved = FlockState(positions, velocities)
+    detector = angledDetector(params.detectDistance, params.detectAngle)
+    frozenBoids = [Boid(frozen, index) for index in range(len(frozen))]
+    for boid in frozenBoids:
+        neighbours = [other for other in frozenBoids if other is not boid and detector(boid, other)]
+        stepped = Boid(moved, boid.index)
+        stepped.attract(Vec3(*params.center), params.attractMultiplier)
+        stepped.avoid(neighbours, params.avoidMultiplier)
+        stepped.followCenter(neighbours, params.followMultiplier)
+        stepped.applyForce()
+        stepped.align(neighbours, params.alignFactor)
+        stepped.limitVelocity(params.minVelocity, params.maxVelocity)
+        stepped.applyVelocity()
+    return moved
+
+
+def test_step_matches_per_boid_rules():
+    random = np.random.RandomState(2)
+    positions = random.uniform(-10, 10, (40, 3))
+    velocities = random.uniform(-1, 1, (40, 3))
+    params = FlockParams(center=(1.0, -2.0, 0.5))
+
+    flock = FlockState(positions, velocities)
+    neighbours = flock.step(params)
+    expected = stepPerBoid(positions, velocities, params)
+
+    assert len(neighbours.rows) > 0
+    np.testing.assert_allclose(flock.positions, expected.positions, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(flock.velocities, expected.velocities, rtol=0, atol=1e-9)
+
+
+def test_limit_velocity_clamps_to_the_limits():
+    flock = FlockState(np.zeros((3, 3)), [[10.0, 0.0, 0.0], [0.0, 0.01, 0.0], [0.0, 0.0, 1.0]])
+    flock.limitVelocity(0.1, 3.0)
+    np.testing.assert_allclose(flock.velocities, [[3.0, 0.0, 0.0], [0.0, 0.1, 0.0], [0.0, 0.0, 1.0]])
@@ -0,0 +1,20 @@
+import numpy as np
+
+from flock import FlockParams
+from flock import FlockState
+from flock_parallel import ParallelFlock
+
+
+def test_parallel_flock_matches_serial_when_params_change():
+    random = np.random.RandomState(3)
+    positions = random.uniform(-30, 30, (300, 3))
+    velocities = random.uniform(-1, 1, (300, 3))
+    params = [FlockParams()] * 3 + [FlockParams(detectDistance=8.0, center=(1.0, 2.0, 3.0))] * 3
+
+    serial = FlockState(positions, velocities)
+    with ParallelFlock(positions, velocities, workers=2) as flock:
+        for frameParams in params:
+            serial.step(frameParams)
+            flock.step(frameParams)
+            np.testing.assert_array_equal(flock.positions, serial.positions)
+            np.testing.assert_array_equal(flock.velocities, serial.velocities)
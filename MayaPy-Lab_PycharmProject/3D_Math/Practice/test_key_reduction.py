@@ -0,0 +1,47 @@
+import numpy as np
+
+from key_reduction import interpolateKeys
+from key_reduction import reduceKeys
+
+
+def test_static_channels_keep_their_first_key():
+    times = np.arange(50)
+    values = np.zeros((50, 4, 3))
+    values[:, 1, 2] = 2.5
+    values[:, 3, 0] = 1e-4 * np.sin(times)
+
+    reduction = reduceKeys(times, values, tolerance=1e-3)
+
+    assert reduction.static.all()
+    assert reduction.keptKeys == 12
+    assert reduction.keep[0].all()
+    keyTimes, keyValues = reduction.channel(5)
+    np.testing.assert_array_equal(keyTimes, [0.0])
+    np.testing.assert_array_equal(keyValues, [2.5])
+
+
+def test_linear_channels_reduce_to_two_keys():
+    times = np.arange(10, 130)
+    values = np.stack([0.5 * times - 3.0, -2.0 * times], axis=1)
+
+    reduction = reduceKeys(times, values, tolerance=1e-6)
+
+    assert not reduction.static.any()
+    for channel in range(2):
+        keyTimes, _ = reduction.channel(channel)
+        np.testing.assert_array_equal(keyTimes, [10.0, 129.0])
+    assert reduction.maxError <= 1e-6
+
+
+def test_max_error_stays_within_tolerance():
+    random = np.random.RandomState(4)
+    times = np.arange(200)
+    values = np.sin(times[:, None, None] * random.uniform(0.01, 0.3, (1, 30, 3))) + random.normal(0, 0.01, (200, 30, 3))
+
+    for tolerance in (1e-3, 1e-2, 1e-1):
+        reduction = reduceKeys(times, values, tolerance=tolerance)
+        flat = values.reshape(200, -1)
+        error = np.abs(interpolateKeys(reduction.times, flat, reduction.keep) - flat).max()
+        assert reduction.maxError == error
+        assert reduction.maxError <= tolerance
+        assert reduction.keptKeys < values.size
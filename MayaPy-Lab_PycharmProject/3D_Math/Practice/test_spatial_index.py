@@ -0,0 +1,28 @@
+import numpy as np
+
+from flock import FlockParams
+from flock import FlockState
+
+
+def test_zero_detect_distance_matches_dense_search():
+    random = np.random.RandomState(0)
+    positions = random.uniform(-10, 10, (50, 3))
+    # two boids sharing a position are still within a zero distance of each other
+    positions[7] = positions[3]
+    velocities = random.uniform(-1, 1, (50, 3))
+    flock = FlockState(positions, velocities)
+    params = FlockParams(detectDistance=0.0, detectAngle=360.0)
+
+    indexed = flock.neighbours(params)
+    dense = flock.denseNeighbours(params)
+
+    np.testing.assert_array_equal(indexed.rows, dense.rows)
+    np.testing.assert_array_equal(indexed.cols, dense.cols)
+    assert sorted(zip(indexed.rows.tolist(), indexed.cols.tolist())) == [(3, 7), (7, 3)]
+
+
+def test_zero_detect_distance_steps():
+    random = np.random.RandomState(1)
+    flock = FlockState(random.uniform(-10, 10, (20, 3)), random.uniform(-1, 1, (20, 3)))
+    flock.step(FlockParams(detectDistance=0.0))
+    assert np.isfinite(flock.positions).all()
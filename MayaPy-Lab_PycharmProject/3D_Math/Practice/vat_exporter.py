@@ -0,0 +1,120 @@
+# coding = utf-8
+"""
+Vertex animation texture (VAT) export of the squash and wave deformers.
+
+The deformer is evaluated frame by frame and the position offsets from the
+rest points are streamed as half floats into <prefix>_pos.raw, so only one
+frame is ever held in memory. Texel (x, y) of frame f holds vertex
+i = row * width + x with y = f * rows_per_frame + row: every frame takes
+rows_per_frame rows of at most max_width texels. Texels are RGBA16F little
+endian, rgb the offset (or the unit normal in <prefix>_nrm.raw) and a = 1.
+<prefix>.json describes the layout and the bounds of the offsets and of the
+deformed points, for the engine side material and culling.
+
+    export_vat(lambda frame: waves.deform(rest, frame), rest, range(240), 'C:/vat/wave')
+"""
+from __future__ import division
+from timeit import default_timer
+import json
+
+import numpy as np
+
+
+def atlas_layout(vertex_count, frame_count, max_width=4096):
+    """(width, height, rows_per_frame) of the texture of vertex_count vertices over frame_count frames"""
+    width = min(vertex_count, max_width) or 1
+    rows_per_frame = -(-vertex_count // width) or 1
+    return width, rows_per_frame * frame_count, rows_per_frame
+
+
+def _frame_texels(values, out):
+    # (N, 3) values into the (rows_per_frame * width, 4) half float texels of a frame, padding texels stay 0
+    out[:len(values), :3] = values
+    return out.tobytes()
+
+
+def export_vat(evaluate, rest_points, frames, path_prefix, normals=None, max_width=4096):
+    """
+    write the VAT of evaluate(frame) -> (N, 3) points over frames, returns the sidecar metadata
+    normals(points) -> (N, 3) adds a normal texture
+    """
+    start = default_timer()
+    rest_points = np.asarray(rest_points, dtype=np.float64)[:, :3]
+    frames = list(frames)
+    width, height, rows_per_frame = atlas_layout(len(rest_points), len(frames), max_width)
+    texels = np.zeros((rows_per_frame * width, 4), dtype='<f2')
+    texels[:len(rest_points), 3] = 1.0
+    normal_texels = texels.copy() if normals is not None else None
+    offset_bounds = [np.full(3, np.inf), np.full(3, -np.inf)]
+    point_bounds = [np.full(3, np.inf), np.full(3, -np.inf)]
+
+    position_path = path_prefix + '_pos.raw'
+    normal_path = path_prefix + '_nrm.raw' if normals is not None else None
+    position_file = open(position_path, 'wb')
+    normal_file = open(normal_path, 'wb') if normal_path else None
+    try:
+        for frame in frames:
+            points = np.asarray(evaluate(frame), dtype=np.float64)[:, :3]
+            offsets = points - rest_points
+            np.minimum(offset_bounds[0], offsets.min(axis=0), out=offset_bounds[0])
+            np.maximum(offset_bounds[1], offsets.max(axis=0), out=offset_bounds[1])
+            np.minimum(point_bounds[0], points.min(axis=0), out=point_bounds[0])
+            np.maximum(point_bounds[1], points.max(axis=0), out=point_bounds[1])
+            position_file.write(_frame_texels(offsets, texels))
+            if normal_file is not None:
+                normal_file.write(_frame_texels(normals(points), normal_texels))
+    finally:
+        position_file.close()
+        if normal_file is not None:
+            normal_file.close()
+
+    metadata = {
+        'vertexCount': len(rest_points),
+        'frameCount': len(frames),
+        'firstFrame': int(frames[0]) if frames else 0,
+        'width': width,
+        'height': height,
+        'rowsPerFrame': rows_per_frame,
+        'format': 'RGBA16F',
+        'positionTexture': position_path,
+        'normalTexture': normal_path,
+        'offsetBounds': {'min': offset_bounds[0].tolist(), 'max': offset_bounds[1].tolist()},
+        'bounds': {'min': point_bounds[0].tolist(), 'max': point_bounds[1].tolist()},
+        'seconds': default_timer() - start,
+    }
+    with open(path_prefix + '.json', 'w') as stream:
+        json.dump(metadata, stream, indent=2, sort_keys=True)
+    return metadata
+
+
+def read_vat(path_prefix):
+    """(F, N, 3) offsets and the metadata of an exported VAT, to check an export"""
+    with open(path_prefix + '.json') as stream:
+        metadata = json.load(stream)
+    texels = np.fromfile(metadata['positionTexture'], dtype='<f2').reshape(
+        metadata['frameCount'], metadata['rowsPerFrame'] * metadata['width'], 4)
+    return texels[:, :metadata['vertexCount'], :3].astype(np.float64), metadata
+
+
+def benchmark(count=10000, frames=240, path_prefix=None):
+    """print the seconds of a wave and a squash export of count points over frames"""
+    import os
+    import tempfile
+
+    import gerstner
+    import squash
+
+    side = int(np.ceil(np.sqrt(count))) - 1
+    rest = gerstner.plane_points(subdivisions_width=side, subdivisions_height=side)[:count]
+    waves = gerstner.GerstnerWaves()
+    deformer = squash.SquashDeformer(rest, range(frames))
+    directory = tempfile.mkdtemp() if path_prefix is None else None
+    for name, evaluate in (('wave', lambda frame: waves.deform(rest, frame)), ('squash', deformer.deform)):
+        prefix = os.path.join(directory, name) if directory else path_prefix + '_' + name
+        metadata = export_vat(evaluate, rest, range(frames), prefix)
+        print('{} {} points x {} frames, {}x{} texture: {:.4f}s'.format(
+            name, len(rest), frames, metadata['width'], metadata['height'], metadata['seconds']))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -1,49 +1,52 @@
 import maya.api.OpenMaya as om
 import maya.cmds as cmds
-import math
+
+from MayaUtils.mesh_io import MeshPointWriter
+import squash
+import vat_exporter
+from scene_backend import MayaBackend
 
 
 def deform_point(time, point):
-    time = time if time < 90 else 180 - time
-    # construct translate
-    th = 0 if time < 60 else (time / 30.0 - 2)
-    ty = (1 - (1 - th) * (1 - th)) * 3
-    # time to t parameter, where t = 0.5: original, t = 0: squash, t = 1: squeeze
-    # t : 0.5 ~ 0, frame0-30; t:0~1, frame 30 - 90 
-    t = 0.5 - time / 60.0 if time < 30 else time / 60.0 - 0.5
-    # constuct sx and sy from t
-    hmax = 1
-    # sy: t=0.5, sy:1; t=0, sy:0.5; t=1, sy:1.5
-    sy = t + 0.5
-    # sx: t=0.5, sx:1; t=0, sx:1.5; t=1, sx:0.5
-    sx = 1.5 - t
-    # construct height based scale
-    h_scale = (-math.cos(3.14 * abs(point.y)) * (t - 0.5) * 0.5 + 1)
-    sx = h_scale * sx
-    mat = om.MTransformationMatrix()
-    mat.setScale([sx, sy, sx], om.MSpace.kObject)
-    translation = om.MVector(0, ty, 0)
-    mat.translateBy(translation, om.MSpace.kWorld)
-    point = point * mat.asMatrix()
-    return [point.x, point.y, point.z]
-
-
-def set_animation(object_name, frames):
-    selection = om.MSelectionList()
-    selection.add(object_name)
-    nodeDagPath = selection.getDagPath(0)
-    mfnMesh = om.MFnMesh(nodeDagPath)
-    points = mfnMesh.getPoints()
+    """squash and stretch of one point, see squash.py for the whole-mesh version"""
+    return squash.deform_point(time, point)
+
+
+def set_animation(object_name, frames, bake=False, tolerance=None):
+    """
+    animate the squash and stretch over frames, the per-frame curve is computed once for the whole range
+    both paths deform the object space points around the pivot,
+    bake writes the pnts curves of every vertex directly instead of keying frame by frame,
+    with a tolerance only the keys key_reduction keeps
+    """
+    if bake:
+        backend = MayaBackend(cmds=cmds)
+        deformer = squash.SquashDeformer(backend.getRestPoints(object_name), range(frames))
+        with backend.writeChunk('squashBake'):
+            reduction = backend.setPointAnimation(object_name, deformer.frames, deformer.bake(), tolerance=tolerance)
+        if reduction is not None:
+            print(reduction)
+        return
+
+    writer = MeshPointWriter(object_name, space=om.MSpace.kObject)
+    deformer = squash.SquashDeformer(writer.readPoints(), range(frames))
+    deformed = None
 
     for frame in range(frames):
         cmds.currentTime(frame)
 
-        for index, p in enumerate(points):
-            deform_p = deform_point(frame, p)
-            cmds.xform("{0}.vtx[{1}]".format(object_name, index), t=deform_p, a=True, ws=True)
+        deformed = deformer.deform(frame, out=deformed)
+        writer.write(deformed)
 
         cmds.setKeyframe(object_name, t=frame, at='pnts')
 
 
-set_animation('pCube1', 120)
+def export_vat(object_name, frames, path_prefix):
+    """write the squash and stretch over frames as a vertex animation texture, see vat_exporter"""
+    # offsets from the rest shape, a squash keyed earlier must not end up in the texture twice
+    deformer = squash.SquashDeformer(MayaBackend(cmds=cmds).getRestPoints(object_name), range(frames))
+    return vat_exporter.export_vat(deformer.deform, deformer.points, deformer.frames, path_prefix)
+
 
+if __name__ == '__main__':
+    set_animation('pCube1', 120)
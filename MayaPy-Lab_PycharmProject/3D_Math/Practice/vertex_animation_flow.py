@@ -1,12 +1,25 @@
 # coding = utf-8
+import os
+
 from PySide2.QtWidgets import *
 from PySide2.QtCore import *
 from shiboken2 import wrapInstance
 import maya.OpenMayaUI as omui
 import maya.api.OpenMaya as om
+import maya.api.OpenMayaAnim as oma
 import maya.cmds as cmds
-import math
 from maya.app.general.mayaMixin import MayaQWidgetBaseMixin
+import numpy as np
+
+import gerstner
+import gerstner_deformer
+import vat_exporter
+import wave_cache
+from preview_scheduler import PreviewScheduler
+from scene_backend import MayaBackend
+from MayaUtils.mesh_io import MeshPointWriter
+from MayaUtils.normals import smoothNormals
+from MayaUtils.point_bridge import pointsToArray
 
 
 # main widget instance
@@ -19,23 +32,41 @@ def maya_main_window():
 
 
 class WaveSimulation(object):
+    """
+    the wave plane is deformed by a gerstnerWave node whose plugs follow the setters, maya plays it back
+    without the plugin the points are pushed from python like before
+    """
     def __init__(self):
         self.meshObj = None
+        self.deformer = None
         self.simulating = False
-        self.stop = False
+        self.fps = 24.0
+        # keyed waves only keep the keys needed to stay within this distance, None keys every frame
+        self.key_tolerance = 1e-3
+        self.__scheduler = None
 
         self.__amp = 0.5
         self.__freq = 0.5
         self.__spd = 0.5
+        # whole-mesh evaluator, its per-wave constants follow the setters below
+        self.__waves = gerstner.GerstnerWaves(self.__amp, self.__freq, self.__spd)
+        # baked preview clips, reused as long as the mesh and the sliders match
+        self.__cache = wave_cache.WaveCache()
 
     def set_amplitude(self, val):
         self.__amp = val
+        self.__waves.set_parameters(amp=val)
+        self.__set_plug("amplitude", val)
 
     def set_frequency(self, val):
         self.__freq = val
+        self.__waves.set_parameters(freq=val)
+        self.__set_plug("frequency", val)
 
     def set_speed(self, val):
         self.__spd = val
+        self.__waves.set_parameters(spd=val)
+        self.__set_plug("speed", val)
 
     def build_mesh(self):
         """Create the water plane mesh"""
@@ -43,6 +74,37 @@ class WaveSimulation(object):
             self.reset()
 
         self.meshObj = cmds.polyPlane(n="WavePlane", sw=10, sh=10, w=20, h=20)
+        self.deformer = self.__create_deformer()
+
+    def __create_deformer(self):
+        """gerstnerWave node on the plane driven by the timeline, None when the plugin does not load"""
+        plugin = os.path.splitext(gerstner_deformer.__file__)[0] + ".py"
+        try:
+            if not cmds.pluginInfo(os.path.basename(plugin), query=True, loaded=True):
+                cmds.loadPlugin(plugin)
+        except RuntimeError:
+            om.MGlobal.displayWarning("gerstnerWave plugin not loaded, the waves are scripted")
+            return None
+        node = cmds.deformer(self.meshObj[0], type=gerstner_deformer.GerstnerDeformer.kNodeName)[0]
+        cmds.connectAttr("time1.outTime", node + ".time")
+        cmds.setAttr(node + ".amplitude", self.__amp)
+        cmds.setAttr(node + ".frequency", self.__freq)
+        cmds.setAttr(node + ".speed", self.__spd)
+        return node
+
+    def __set_plug(self, name, val):
+        if self.deformer is not None:
+            cmds.setAttr("{}.{}".format(self.deformer, name), val)
+
+    def rest_points(self):
+        """(N, 3) object space points of the plane before the waves, keyed pnts tweaks left out"""
+        if self.deformer is None:
+            return MayaBackend(cmds=cmds).getRestPoints(self.meshObj[0])
+        selection = om.MSelectionList()
+        selection.add(self.deformer)
+        source = oma.MFnGeometryFilter(selection.getDependNode(0)).getInputGeometry()[0]
+        return pointsToArray(om.MFnMesh(source).getPoints())
+
     def subdiv_mesh(self):
         if self.meshObj is None:
             return
@@ -53,99 +115,113 @@ class WaveSimulation(object):
         if self.meshObj is None:
             return
 
+        if self.simulating:
+            return
+        if self.deformer is not None:
+            # the node is the animation, maya only has to evaluate it, the playback range is left alone
+            if keyFrame:
+                for frame in range(frames):
+                    cmds.currentTime(frame, edit=True)
+            else:
+                cmds.play(forward=True)
+            return
+
         # Start simulation
         self.simulating = True
 
-        # get points position from selection object
-        selection = om.MSelectionList()
-        selection.add(self.meshObj[0])
-        nodeDagPath = selection.getDagPath(0)
-        mfnMesh = om.MFnMesh(nodeDagPath)
-        points = mfnMesh.getPoints()
-
         # check if should insert keyframe
         if keyFrame:
-            self.simulate_with_keyframe(frames=frames, points=points)
+            self.simulate_with_keyframe(frames=frames)
         else:
-            self.simulate_without_keyframe(points=points)
+            # get points position from the mesh, the writer pushes every frame back in one call
+            writer = MeshPointWriter(self.meshObj[0])
+            points = np.array(writer.readPoints())
+            counts, connects = writer.mfnMesh.getVertices()
+            topology = wave_cache.topology_hash(points, counts, connects)
+            # the preview keeps playing from the scheduler, it ends the simulation when stopped
+            self.simulate_without_keyframe(points=points, writer=writer, topology=topology)
+            return
 
         # End Simulation
         self.simulating = False
 
-    def simulate_with_keyframe(self, frames, points):
-        """simulate and set keyframe"""
+    def simulate_with_keyframe(self, frames):
+        """bake every frame in memory, then key the pnts curves in bulk with only the keys key_tolerance needs"""
+        backend = MayaBackend(cmds=cmds)
+        rest = backend.getRestPoints(self.meshObj[0])
+        baked = np.empty((frames,) + rest.shape)
         for frame in range(frames):
-            # update the time in the timeline
-            cmds.currentTime(frame, edit=True)
-
-            # break the loop if stop playing the preview
-            if self.stop:
-                self.stop = False
-                break
-            # traversal all points
-            for index, p in enumerate(points):
-                deform_p = self.deform_point(time=frame, point=p)
-                cmds.xform("{0}.vtx[{1}]".format(self.meshObj[0], index), t=deform_p, a=True, ws=True)
-            # insert keyframe
-            cmds.setKeyframe(self.meshObj[0], t=frame, at="pnts")
-
-    def simulate_without_keyframe(self, points):
-        """ simulation without setting keyframes """
+            self.__waves.deform(rest, frame, out=baked[frame])
+        with backend.writeChunk('waveBake'):
+            reduction = backend.setPointAnimation(self.meshObj[0], range(frames), baked, tolerance=self.key_tolerance)
+        if reduction is not None:
+            print(reduction)
+
+    def simulate_without_keyframe(self, points, writer, topology=None):
+        """ simulation without setting keyframes, played by a timer so maya stays responsive """
         frame = cmds.currentTime(q=True)  # get current timeline key position
-
-        def infinite():
-            while True:
-                yield None
-
-        # a infinite for loop
-        for _ in infinite():
-            frame += 1
-            # break the loop if stop playing the preview
-            if self.stop:
-                self.stop = False
-                break
-            # traversal all points
-            for index, p in enumerate(points):
-                deform_p = self.deform_point(frame, p)
-                cmds.xform("{0}.vtx[{1}]".format(self.meshObj[0], index), t=deform_p, a=True, ws=True)
-
-            # force a redraw during script execution
-            cmds.refresh()
+        buffers = {}
+        topology = topology or wave_cache.topology_hash(points)
+        clip = self.__cache.clip(points, self.__amp, self.__freq, self.__spd, start=frame + 1, topology=topology)
+        clip_key = wave_cache.WaveCache.key(topology, self.__amp, self.__freq, self.__spd)
+        # owned by the worker thread, the sliders only reach it through the per-frame snapshot
+        waves = gerstner.GerstnerWaves(self.__amp, self.__freq, self.__spd)
+
+        def step(frame, params):
+            # the sliders stay live, other parameters play a cached clip if there is one or deform live
+            key = wave_cache.WaveCache.key(topology, *params)
+            current = clip if key == clip_key else self.__cache.get(key)
+            cached = current.points(frame) if current is not None else None
+            if cached is None:
+                if buffers.get('params') != params:
+                    buffers['params'] = params
+                    waves.set_parameters(*params)
+                buffers['deformed'] = cached = waves.deform(points, frame, out=buffers.get('deformed'))
+            return cached
+
+        def write(frame, deformed):
+            writer.write(deformed)
+
+        self.__scheduler = PreviewScheduler(step, write, fps=self.fps,
+                                            snapshot=lambda: (self.__amp, self.__freq, self.__spd))
+        self.__scheduler.finished.connect(self.__preview_finished)
+        self.__scheduler.start(frame)
+
+    def export_vat(self, path_prefix, frames=240, normals=False):
+        """write the current waves over frames as a vertex animation texture, see vat_exporter"""
+        if self.meshObj is None:
+            return None
+        points = self.rest_points()
+        normals_of = None
+        if normals:
+            counts, connects = MeshPointWriter(self.meshObj[0]).mfnMesh.getVertices()
+            normals_of = lambda deformed: smoothNormals(deformed, counts, connects)
+        metadata = vat_exporter.export_vat(lambda frame: self.__waves.deform(points, frame), points,
+                                           range(frames), path_prefix, normals=normals_of)
+        print("VAT exported to {}.json in {:.2f}s".format(path_prefix, metadata['seconds']))
+        return metadata
+
+    def __preview_finished(self):
+        print(self.__scheduler.stats())
+        self.__scheduler = None
+        self.simulating = False
 
     def deform_point(self, time, point):
         """per vertex operation"""
-
-        # direction of the wave
-        dir1 = om.MVector(0.47, 0, 0.35)
-        dir2 = om.MVector(-0.96, 0, 0.23)
-        dir3 = om.MVector(0.77, 0, -1.47)
-        dir4 = om.MVector(-0.3, 0, -0.2)
-
-        # overlay calculation
-        point += self.wave(point, dir1, 0.016 * self.__amp, 0.8 * self.__freq, time * 20 * self.__spd)
-        point += self.wave(point, dir4, 0.036 * self.__amp, 2.4 * self.__freq, time * 30 * self.__spd)
-        point += self.wave(point, dir2, 0.024 * self.__amp, 3.6 * self.__freq, time * 30 * self.__spd)
-        point += self.wave(point, dir3, 0.028 * self.__amp, 2.0 * self.__freq, time * 10 * self.__spd)
-
-        return [point.x, point.y, point.z]
+        return gerstner.deform_point(point, time, self.__amp, self.__freq, self.__spd)
 
     def wave(self, point, flow_dir, amp, freq, time):
         """general gerstner wave calculation"""
-        p = om.MVector(point.x, 0, point.z)
-        d = om.MVector(flow_dir.x, 0, flow_dir.z).normal()
-        f = (p * d) * freq + time / 120
-        p.x = amp * d.x * math.cos(f)
-        p.z = amp * d.z * math.cos(f)
-        p.y = amp * math.sin(f)
-
-        return p
+        return om.MVector(*gerstner.wave(point, flow_dir, amp, freq, time))
 
     def stop_preview(self):
         if self.meshObj is None:
             return
         """stop playing the animation preview """
-        if self.simulating:
-            self.stop = True
+        if self.deformer is not None:
+            cmds.play(state=False)
+        elif self.__scheduler is not None:
+            self.__scheduler.stop()
 
     def reset(self):
         if self.meshObj is None:
@@ -203,6 +279,7 @@ class WaveWidget(MayaQWidgetBaseMixin, QDialog):
         self.playPreviewBtn = QPushButton("Play Preview")
         self.stopPreviewBtn = QPushButton("Stop Preview")
         self.resetBtn = QPushButton("Reset")
+        self.exportVatBtn = QPushButton("Export VAT")
 
     def __create_layouts(self):
         form_layout = QFormLayout()
@@ -217,6 +294,7 @@ class WaveWidget(MayaQWidgetBaseMixin, QDialog):
         btn_layout.addWidget(self.playPreviewBtn)
         btn_layout.addWidget(self.stopPreviewBtn)
         btn_layout.addWidget(self.simulateBtn)
+        btn_layout.addWidget(self.exportVatBtn)
 
         main_layout = QVBoxLayout(self)
         main_layout.addLayout(form_layout)
@@ -233,6 +311,7 @@ class WaveWidget(MayaQWidgetBaseMixin, QDialog):
         self.playPreviewBtn.clicked.connect(self.__play_preview_btn_clicked)
         self.stopPreviewBtn.clicked.connect(self.__stop_preview_btn_clicked)
         self.resetBtn.clicked.connect(self.__reset_btn_clicked)
+        self.exportVatBtn.clicked.connect(self.__export_vat_btn_clicked)
 
     def __amplitudeChanged(self):
         print(self.get_wave_amplitude())
@@ -266,6 +345,12 @@ class WaveWidget(MayaQWidgetBaseMixin, QDialog):
         print("Stop Preview")
         self.wave.stop_preview()
 
+    def __export_vat_btn_clicked(self):
+        print("Export VAT")
+        path, _ = QFileDialog.getSaveFileName(self, "Export VAT", "", "VAT Sidecar (*.json)")
+        if path:
+            self.wave.export_vat(path[:-5] if path.endswith(".json") else path, frames=240, normals=True)
+
     def __reset_btn_clicked(self):
         print("Reset")
         self.wave.stop_preview()
@@ -0,0 +1,174 @@
+# coding = utf-8
+"""
+Precomputed Gerstner wave frames for the wave preview.
+
+For fixed parameters the deformed points only depend on the frame, so a clip
+bakes them once into a float32 (frames, N, 3) array and playback just indexes
+it. Every wave phase advances by time * speed_scale * spd / 120 and the speed
+scales are all multiples of 10, so the whole sum repeats when
+frames * 10 * spd / 120 reaches a multiple of 2 pi. detect_period looks for the
+first whole frame count close enough to such a period, checked on the real
+points, and a clip of one period then plays back forever.
+
+WaveCache keeps the clips keyed by (mesh topology hash, amp, freq, spd) and
+evicts the least recently used ones once memory_budget bytes are exceeded.
+With a cache_dir the clips are memory-mapped .npy files instead; they are paged
+by the OS and do not count against the budget.
+"""
+from collections import OrderedDict
+from timeit import default_timer
+import hashlib
+import math
+import os
+
+import numpy as np
+
+import gerstner
+
+# the slowest wave speed, every wave of gerstner.WAVES runs at a whole multiple of it
+_BASE_SPEED = 10
+
+
+def topology_hash(points, counts=None, connects=None):
+    """hash of the rest points and, when given, the polygon counts / connects of the mesh"""
+    digest = hashlib.sha1()
+    for array, dtype in ((points, np.float64), (counts, np.int64), (connects, np.int64)):
+        if array is not None:
+            array = np.ascontiguousarray(array, dtype=dtype)
+            digest.update(str(array.shape).encode())
+            digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def detect_period(points, waves, spd, max_frames=1000, tolerance=1e-4, start=0):
+    """whole frame count after which the waves repeat within tolerance, None if none up to max_frames"""
+    if spd == 0:
+        return 1
+    frames = np.arange(1, max_frames + 1)
+    phase = frames * _BASE_SPEED * spd / 120.0
+    drift = np.abs(phase - np.round(phase / (2 * math.pi)) * 2 * math.pi)
+    reference = waves.deform(points, start)
+    # check the best aligned frame counts on the real points, shortest first to keep the clip small
+    for frame_count in np.sort(frames[np.argsort(drift, kind='stable')][:8]):
+        if np.abs(waves.deform(points, start + frame_count) - reference).max() <= tolerance:
+            return int(frame_count)
+    return None
+
+
+class WaveClip(object):
+    """deformed points of frames [start, start + len(self)), played back modulo len(self) when periodic"""
+
+    def __init__(self, frames, start, periodic, path=None):
+        self.frames = frames
+        self.start = start
+        self.periodic = periodic
+        self.path = path
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def nbytes(self):
+        return self.frames.nbytes
+
+    def points(self, frame):
+        """float32 (N, 3) points of frame, None when the clip does not cover it"""
+        index = int(round(frame - self.start))
+        if self.periodic:
+            index %= len(self.frames)
+        elif index < 0 or index >= len(self.frames):
+            return None
+        return self.frames[index]
+
+
+class WaveCache(object):
+    """LRU of WaveClips keyed by (topology hash, amp, freq, spd)"""
+
+    def __init__(self, memory_budget=256 * 1024 * 1024, cache_dir=None, max_period=1000, tolerance=1e-4):
+        self.memory_budget = memory_budget
+        self.cache_dir = cache_dir
+        self.max_period = max_period
+        self.tolerance = tolerance
+        self.build_time = 0.0
+        self._clips = OrderedDict()
+
+    def __len__(self):
+        return len(self._clips)
+
+    def __contains__(self, key):
+        return key in self._clips
+
+    @property
+    def memory_used(self):
+        return sum(clip.nbytes for clip in self._clips.values() if clip.path is None)
+
+    @staticmethod
+    def key(topology, amp, freq, spd):
+        return topology, float(amp), float(freq), float(spd)
+
+    def get(self, key):
+        clip = self._clips.pop(key, None)
+        if clip is not None:
+            # re-inserted as the most recently used
+            self._clips[key] = clip
+        return clip
+
+    def clip(self, points, amp, freq, spd, start=0, frame_count=240, topology=None):
+        """cached clip of these points and parameters, built on a miss; None if not even one frame fits the budget"""
+        points = np.asarray(points, dtype=np.float64)
+        key = self.key(topology or topology_hash(points), amp, freq, spd)
+        clip = self.get(key)
+        if clip is None:
+            clip = self.build(key, points, amp, freq, spd, start, frame_count)
+        return clip
+
+    def build(self, key, points, amp, freq, spd, start=0, frame_count=240):
+        begin = default_timer()
+        waves = gerstner.GerstnerWaves(amp, freq, spd)
+        period = detect_period(points, waves, spd, self.max_period, self.tolerance, start)
+        frame_bytes = len(points) * 3 * np.dtype(np.float32).itemsize
+        if self.cache_dir is None:
+            # a period that does not fit would play back with a jump, cache a plain range instead
+            fitting = self.memory_budget // max(frame_bytes, 1)
+            if period is not None and period > fitting:
+                period = None
+            count = period or min(frame_count, fitting)
+        else:
+            count = period or frame_count
+        if count <= 0:
+            return None
+
+        path = None
+        if self.cache_dir is None:
+            frames = np.empty((count, len(points), 3), dtype=np.float32)
+        else:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            path = os.path.join(self.cache_dir, 'wave_{}.npy'.format(
+                hashlib.sha1(repr(key).encode()).hexdigest()))
+            frames = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(count, len(points), 3))
+        deformed = None
+        for index in range(count):
+            deformed = waves.deform(points, start + index, out=deformed)
+            frames[index] = deformed
+
+        clip = WaveClip(frames, start, period is not None, path)
+        self._clips[key] = clip
+        self._evict(keep=key)
+        self.build_time = default_timer() - begin
+        return clip
+
+    def _evict(self, keep=None):
+        while self.memory_used > self.memory_budget:
+            key = next((key for key, clip in self._clips.items() if clip.path is None and key != keep), None)
+            if key is None:
+                break
+            del self._clips[key]
+
+    def clear(self):
+        for clip in self._clips.values():
+            if clip.path is not None:
+                # drop the mapping before removing its file
+                clip.frames = None
+                os.remove(clip.path)
+        self._clips.clear()
@@ -7,11 +7,15 @@ from PySide2.QtWidgets import *
 from PySide2.QtCore import *
 from shiboken2 import wrapInstance
 import maya.OpenMayaUI as omui
-import maya.api.OpenMaya as om
 from maya import cmds
 import math
 from maya.app.general.mayaMixin import MayaQWidgetBaseMixin
 
+from MayaUtils.Utils import findRoot
+from MayaUtils.Utils import getSkinClusterFromMesh
+from shell_builder import createShellMesh
+from shell_builder import transferShellWeights
+
 # main widget instance
 def maya_main_window():
     """
@@ -21,33 +25,29 @@ def maya_main_window():
     return wrapInstance(long(main_win_ptr), QWidget)
 
 class ShellGenerator(object):
-    def __init__(self, layerAmount):
+    def __init__(self, layerAmount, furLength=0.0, furLengthMap=None, gravity=(0, -1, 0), gravityStrength=0.0):
         self.layerAmount = layerAmount
         self.furStep =  1 / float(self.layerAmount)
         self.obj = cmds.ls(sl=True)[0]
-        self.objsToCombine = []
+        # with a fur length the layers are pushed out along the normals here instead of in the shader
+        self.furLength = furLength
+        # per-vertex values, a color set or a texture node scaling the fur length, read from red
+        self.furLengthMap = furLengthMap
+        self.gravity = gravity
+        self.gravityStrength = gravityStrength
 
     def generate(self):
-        # Duplicate Objects
-        for i in range(0,self.layerAmount+1):
-            self.objsToCombine.append(cmds.duplicate(self.obj))
-        # Vertex Painting
-        for i in range(0,self.layerAmount+1):
-            paintObj = self.objsToCombine[i][0]
-            paintColor = [i * self.furStep, 0, 0, 1]
-            self.__obj_vertex_painting(paintObj,paintColor,i)
-
-        # Combine selected objects
-        for o in self.objsToCombine:
-            cmds.select(o, add=True)
-        combinedObj = cmds.polyUnite()[0]
-
-        mel.eval("cleanUpScene 3")  # clean up the scene unused objects
-        cmds.delete(ch=True)  # remove history
+        # Build all layers as one painted mesh, no duplicates, polyUnite or history to clean up
+        combinedObj = createShellMesh(self.obj, self.layerAmount,
+                                      furLength=self.furLength,
+                                      furLengthMap=self.furLengthMap,
+                                      gravity=self.gravity,
+                                      gravityStrength=self.gravityStrength)
 
         # set parent back after combined
         objParent = cmds.listRelatives(self.obj, parent=True)
-        cmds.parent(combinedObj, objParent)
+        if objParent:
+            combinedObj = cmds.parent(combinedObj, objParent)[0]
 
         # Find the Root Joint in the scene
         rig = self.__findRoot("joint")
@@ -55,51 +55,17 @@ class ShellGenerator(object):
         # Bind Skin and Joint
         self.__bind_skin_to_joint(rig, combinedObj)
 
-        # Copy Skin Weight through skin cluster
+        # Copy Skin Weight through skin cluster, every layer takes the weights of the source vertex it copies
         sourceCluster = self.__get_skin_cluster_from_mesh(self.obj)
         targetCluster = self.__get_skin_cluster_from_mesh(combinedObj)
-        cmds.copySkinWeights(ss=sourceCluster, ds=targetCluster, noMirror=True)
+        transferShellWeights(sourceCluster, targetCluster, self.layerAmount)
         cmds.delete(self.obj)
         # rename object
         cmds.rename(combinedObj, self.obj)
 
-    def __obj_vertex_painting(self, objToPaint,color,index=0):
-        sel_obj = objToPaint
-        selection = om.MSelectionList()
-        selection.add(sel_obj)
-        nodeDagPath = selection.getDagPath(0)
-        mfnMesh = om.MFnMesh(nodeDagPath)
-        gMainProgressBar = mel.eval('$tmp = $gMainProgressBar')
-
-        cmds.progressBar(gMainProgressBar,
-                         edit=True,
-                         beginProgress=True,
-                         isInterruptable=True,
-                         status=str(index)+': VertexColor Painting ...',
-                         maxValue=mfnMesh.numVertices)
-
-        for vertId in range(mfnMesh.numVertices):
-            if cmds.progressBar(gMainProgressBar, query=True, isCancelled=True):
-                break
-            cmds.progressBar(gMainProgressBar, edit=True, step=1)
-            col = om.MColor(color)
-            mfnMesh.setVertexColor(col, vertId)
-
-        cmds.progressBar(gMainProgressBar, edit=True, endProgress=True)
-
     def __findRoot(self,objType=""):
-        """Find Root Joint"""
-        rootObj = None
-        if objType == "":
-            print("No given type of root object")
-            return None
-        else:
-            allObjs = cmds.ls(typ=objType)
-            for obj in allObjs:
-                parentObj = cmds.listRelatives(obj, parent=True, typ=objType)
-                if not parentObj:
-                    rootObj = obj
-        return rootObj
+        """Find Root Joint of the skeleton the source mesh is bound to"""
+        return findRoot(objType, mesh=self.obj)
 
 
     def __bind_skin_to_joint(self,joint, mesh):
@@ -107,8 +73,7 @@ class ShellGenerator(object):
 
 
     def __get_skin_cluster_from_mesh(self,mesh):
-        skinClusterStr2 = 'findRelatedSkinCluster("' + mesh + '")'
-        return mel.eval(skinClusterStr2)
+        return getSkinClusterFromMesh(mesh)
 
 
 
@@ -123,8 +88,8 @@ class MainWindow(QDialog):
         self.setWindowTitle("Shell Generator")
         self.setMinimumWidth(140)
         self.setMaximumWidth(140)
-        self.setMinimumHeight(100)
-        self.setMaximumHeight(100)
+        self.setMinimumHeight(240)
+        self.setMaximumHeight(240)
         # remove the question mark button in dialog by using XOR to exclude
         self.setWindowFlags(self.windowFlags() ^ Qt.WindowContextHelpButtonHint)
 
@@ -138,12 +103,29 @@ class MainWindow(QDialog):
         self.shellLayerSpinBox.setValue(5)
         self.shellLayerSpinBox.setMinimum(5)
         self.shellLayerSpinBox.setMaximum(100)
+        self.furLengthLabel = QLabel("Fur Length")
+        self.furLengthSpinBox = QDoubleSpinBox()
+        self.furLengthSpinBox.setSingleStep(0.01)
+        self.furLengthSpinBox.setValue(0.0)
+        self.furLengthMapLabel = QLabel("Fur Length Map")
+        self.furLengthMapLineEdit = QLineEdit()
+        self.furLengthMapLineEdit.setPlaceholderText("color set or texture")
+        self.gravityLabel = QLabel("Gravity")
+        self.gravitySpinBox = QDoubleSpinBox()
+        self.gravitySpinBox.setSingleStep(0.01)
+        self.gravitySpinBox.setValue(0.0)
         self.generateShellBtn = QPushButton("Generate")
 
     def __create_layouts(self):
         content_layout = QVBoxLayout()
         content_layout.addWidget(self.generateShellLabel)
         content_layout.addWidget(self.shellLayerSpinBox)
+        content_layout.addWidget(self.furLengthLabel)
+        content_layout.addWidget(self.furLengthSpinBox)
+        content_layout.addWidget(self.furLengthMapLabel)
+        content_layout.addWidget(self.furLengthMapLineEdit)
+        content_layout.addWidget(self.gravityLabel)
+        content_layout.addWidget(self.gravitySpinBox)
 
         btn_layout = QVBoxLayout()
         btn_layout.addWidget(self.generateShellBtn)
@@ -158,7 +140,10 @@ class MainWindow(QDialog):
 
     def __generate_shell_btn_clicked(self):
         print("Generate Fur Shell")
-        self.shellGenerator = ShellGenerator(self.shellLayerSpinBox.value())
+        self.shellGenerator = ShellGenerator(self.shellLayerSpinBox.value(),
+                                             furLength=self.furLengthSpinBox.value(),
+                                             furLengthMap=self.furLengthMapLineEdit.text() or None,
+                                             gravityStrength=self.gravitySpinBox.value())
         self.shellGenerator.generate()
 
 
@@ -0,0 +1,308 @@
+# coding = utf-8
+"""
+Fur shell mesh built in one MFnMesh.create call.
+
+buildShellData stacks layerAmount + 1 copies of the source topology into the
+arrays MFnMesh.create / assignUVs / setFaceVertexNormals / setVertexColors
+take, layer by layer like polyUnite of the duplicates would: vertex i of layer
+k is vertex k * N + i of the shell mesh and face f of layer k is face
+k * F + f. Each layer is painted red = k / layerAmount. It only needs NumPy,
+so the combined mesh can be built and checked without Maya.
+
+layerOffsets bakes the fur into the layers instead of leaving it to the
+shader: layer k of a vertex moves by furLength * lengthMap * h along its
+smoothed normal, h = k / layerAmount, plus gravity * gravityStrength * h * h so
+the roots leave the surface along the normal and the tips bend over.
+
+tileWeights repeats the skin weights of the source for every layer: shell
+vertex k * N + i takes the weights of source vertex i exactly, no closest point
+search needed.
+
+readMeshData and createShellMesh are the Maya side: read the source mesh once,
+create the shell mesh and copy the shading of the source. The source normals
+are set on every layer as locked face vertex normals, so the shells keep the
+shading of the source whatever the edge smoothing of the new mesh. Every shell
+face joins the shading group of its source face. Only the current UV set is
+copied and the layer colors go to their own color set; other UV and color sets
+of the source are dropped.
+"""
+from __future__ import division
+from collections import namedtuple
+
+import numpy as np
+
+try:
+    # QLineEdit.text() returns unicode under Python 2, where the UI runs
+    _STRING_TYPES = (basestring,)
+except NameError:
+    _STRING_TYPES = (str,)
+
+ShellMeshData = namedtuple('ShellMeshData', [
+    'points',              # (L * N, 3)
+    'counts',              # (L * F,) vertices per face
+    'connects',            # (L * FV,) vertex ids per face vertex
+    'uValues',             # (L * U,) or None
+    'vValues',
+    'uvCounts',            # (L * F,) uvs per face
+    'uvIds',               # (L * FV,)
+    'faceVertexNormals',   # (L * FV, 3) or None
+    'faceIds',             # (L * FV,) face of every face vertex
+    'colors',              # (L * N, 4) layer color per vertex
+    'layerIds',            # (L * N,) layer of every vertex
+])
+
+
+def layerColors(layerAmount, vertexCount):
+    """(layerAmount + 1) * vertexCount RGBA colors, red encodes the layer"""
+    layers = np.repeat(np.arange(layerAmount + 1), vertexCount)
+    colors = np.zeros((len(layers), 4))
+    colors[:, 0] = layers / layerAmount
+    colors[:, 3] = 1.0
+    return colors, layers
+
+
+def _tile(values, layers, step=0):
+    # layers copies of values, copy k shifted by k * step
+    values = np.asarray(values)
+    tiled = np.tile(values, (layers,) + (1,) * (values.ndim - 1))
+    if step:
+        tiled += np.repeat(np.arange(layers) * step, len(values)).reshape((-1,) + (1,) * (values.ndim - 1))
+    return tiled
+
+
+def vertexNormals(vertexCount, connects, faceVertexNormals):
+    """(N, 3) smoothed vertex normals, the normalized sum of the face vertex normals around every vertex"""
+    connects = np.asarray(connects, dtype=np.int64)
+    faceVertexNormals = np.asarray(faceVertexNormals, dtype=np.float64)
+    normals = np.stack([np.bincount(connects, faceVertexNormals[:, k], minlength=vertexCount)
+                        for k in range(3)], axis=1)
+    lengths = np.sqrt(np.einsum('ij,ij->i', normals, normals))
+    lengths[lengths == 0] = 1.0
+    return normals / lengths[:, None]
+
+
+def vertexUVs(vertexCount, connects, uValues, vValues, uvIds):
+    """(N, 2) one uv per vertex, the uv of its last face vertex when the vertex sits on a uv seam"""
+    uvs = np.zeros((vertexCount, 2))
+    uvIds = np.asarray(uvIds, dtype=np.int64)
+    uvs[np.asarray(connects, dtype=np.int64)] = np.stack([np.asarray(uValues)[uvIds], np.asarray(vValues)[uvIds]],
+                                                         axis=1)
+    return uvs
+
+
+def layerOffsets(normals, layerAmount, furLength, lengthMap=None, gravity=(0.0, -1.0, 0.0), gravityStrength=0.0):
+    """(layerAmount + 1, N, 3) offsets of every layer, lengthMap scales furLength per vertex"""
+    normals = np.asarray(normals, dtype=np.float64)
+    heights = np.arange(layerAmount + 1) / layerAmount
+    lengths = np.full(len(normals), float(furLength))
+    if lengthMap is not None:
+        lengths *= np.asarray(lengthMap, dtype=np.float64)
+    offsets = heights[:, None, None] * (normals * lengths[:, None])[None]
+    if gravityStrength:
+        bend = np.asarray(gravity, dtype=np.float64) * gravityStrength
+        offsets += (heights * heights)[:, None, None] * (lengths[:, None] * bend)[None]
+    return offsets
+
+
+def buildShellData(points, counts, connects, layerAmount, uValues=None, vValues=None, uvCounts=None, uvIds=None,
+                   faceVertexNormals=None, offsets=None):
+    """
+    combined shell mesh arrays of layerAmount + 1 layers of the source mesh
+    points (N, 3), counts (F,), connects (FV,) come from MFnMesh.getPoints / getVertices,
+    the uvs from getUVs / getAssignedUVs and faceVertexNormals (FV, 3) from getNormals / getNormalIds
+    offsets (layerAmount + 1, N, 3) from layerOffsets are added to the points of every layer
+    """
+    points = np.asarray(points, dtype=np.float64)[:, :3]
+    counts = np.asarray(counts, dtype=np.int64)
+    connects = np.asarray(connects, dtype=np.int64)
+    layers = layerAmount + 1
+    vertexCount = len(points)
+
+    colors, layerIds = layerColors(layerAmount, vertexCount)
+    faceIds = np.repeat(np.arange(len(counts) * layers), np.tile(counts, layers))
+
+    if uValues is not None:
+        uvCounts = counts if uvCounts is None else np.asarray(uvCounts, dtype=np.int64)
+        uvData = (_tile(np.asarray(uValues, dtype=np.float64), layers),
+                  _tile(np.asarray(vValues, dtype=np.float64), layers),
+                  _tile(uvCounts, layers),
+                  _tile(np.asarray(uvIds, dtype=np.int64), layers, len(uValues)))
+    else:
+        uvData = (None, None, None, None)
+
+    if faceVertexNormals is not None:
+        faceVertexNormals = _tile(np.asarray(faceVertexNormals, dtype=np.float64), layers)
+
+    shellPoints = _tile(points, layers)
+    if offsets is not None:
+        shellPoints += np.asarray(offsets, dtype=np.float64).reshape(-1, 3)
+
+    return ShellMeshData(
+        shellPoints,
+        _tile(counts, layers),
+        _tile(connects, layers, vertexCount),
+        uvData[0], uvData[1], uvData[2], uvData[3],
+        faceVertexNormals,
+        faceIds,
+        colors,
+        layerIds,
+    )
+
+
+def tileWeights(weights, layerAmount, sourceInfluences, targetInfluences):
+    """
+    (layerAmount + 1) * N rows of weights over targetInfluences
+    weights are the (N, len(sourceInfluences)) source weights, influences missing from the source get 0
+    """
+    weights = np.asarray(weights, dtype=np.float64).reshape(-1, len(sourceInfluences))
+    missing = [name for name in sourceInfluences if name not in targetInfluences]
+    if missing:
+        raise ValueError('The shell skin cluster is not bound to {}.'.format(', '.join(missing)))
+    columns = [targetInfluences.index(name) for name in sourceInfluences]
+    full = np.zeros((len(weights), len(targetInfluences)))
+    full[:, columns] = weights
+    return np.tile(full, (layerAmount + 1, 1))
+
+
+def readMeshData(meshName, space=None):
+    """the source arrays of buildShellData, read in world space like polyUnite bakes them by default"""
+    import maya.api.OpenMaya as om
+    from MayaUtils.mesh_io import getMesh
+
+    space = om.MSpace.kWorld if space is None else space
+    mesh = getMesh(meshName)
+    counts, connects = mesh.getVertices()
+    data = {
+        'points': mesh.getPoints(space),
+        'counts': counts,
+        'connects': connects,
+        # one normal per face vertex, in the order of connects
+        'faceVertexNormals': mesh.getFaceVertexNormals(space),
+    }
+    if mesh.mfnMesh.numUVs():
+        uValues, vValues = mesh.mfnMesh.getUVs()
+        uvCounts, uvIds = mesh.mfnMesh.getAssignedUVs()
+        data.update(uValues=np.array(uValues), vValues=np.array(vValues),
+                    uvCounts=np.array(uvCounts, dtype=np.int64), uvIds=np.array(uvIds, dtype=np.int64))
+    return data
+
+
+def readFurLengthMap(meshName, furLengthMap, meshData):
+    """
+    (N,) fur length scale of every vertex, furLengthMap is either a sequence of values,
+    the name of a color set of the mesh or a texture node sampled at the vertex uvs, both read from red
+    """
+    from maya import cmds
+    from MayaUtils.mesh_io import getMesh
+
+    if not isinstance(furLengthMap, _STRING_TYPES):
+        return np.asarray(furLengthMap, dtype=np.float64)
+    mesh = getMesh(meshName)
+    if furLengthMap in mesh.mfnMesh.getColorSetNames():
+        return mesh.getColors(furLengthMap)[:, 0]
+    if 'uValues' not in meshData:
+        raise ValueError('{} has no uvs to sample {} at.'.format(meshName, furLengthMap))
+    uvs = vertexUVs(len(meshData['points']), meshData['connects'],
+                    meshData['uValues'], meshData['vValues'], meshData['uvIds'])
+    # one colorAtPoint call samples every vertex, it returns r, g, b per sample
+    samples = cmds.colorAtPoint(furLengthMap, output='RGB', u=uvs[:, 0].tolist(), v=uvs[:, 1].tolist())
+    return np.array(samples[0::3], dtype=np.float64)
+
+
+def faceRanges(faceIds):
+    """inclusive (first, last) runs of consecutive ids in the sorted faceIds, for f[first:last] components"""
+    faceIds = np.asarray(faceIds, dtype=np.int64)
+    if not len(faceIds):
+        return []
+    breaks = np.flatnonzero(np.diff(faceIds) != 1) + 1
+    firsts = faceIds[np.concatenate([[0], breaks])]
+    lasts = faceIds[np.concatenate([breaks - 1, [len(faceIds) - 1]])]
+    return list(zip(firsts.tolist(), lasts.tolist()))
+
+
+def createShellMesh(sourceName, layerAmount, shellData=None, name=None, colorSet='furLayer',
+                    furLength=0.0, furLengthMap=None, gravity=(0.0, -1.0, 0.0), gravityStrength=0.0):
+    """
+    create the shell mesh of sourceName under a new transform, returns the transform name
+    with a furLength the layers are baked out along the smoothed normals, see layerOffsets and readFurLengthMap
+    """
+    import maya.api.OpenMaya as om
+    from maya import cmds
+    from MayaUtils.mesh_io import getMesh
+    from MayaUtils.point_bridge import arrayToColors
+    from MayaUtils.point_bridge import arrayToPoints
+    from MayaUtils.point_bridge import arrayToVectors
+
+    if shellData is None:
+        meshData = readMeshData(sourceName)
+        if furLength:
+            lengthMap = None if furLengthMap is None else readFurLengthMap(sourceName, furLengthMap, meshData)
+            normals = vertexNormals(len(meshData['points']), meshData['connects'], meshData['faceVertexNormals'])
+            meshData['offsets'] = layerOffsets(normals, layerAmount, furLength, lengthMap, gravity, gravityStrength)
+        shellData = buildShellData(layerAmount=layerAmount, **meshData)
+
+    mfnMesh = om.MFnMesh()
+    if shellData.uValues is not None:
+        transform = mfnMesh.create(arrayToPoints(shellData.points),
+                                   om.MIntArray(shellData.counts.tolist()),
+                                   om.MIntArray(shellData.connects.tolist()),
+                                   om.MFloatArray(shellData.uValues.tolist()),
+                                   om.MFloatArray(shellData.vValues.tolist()))
+        mfnMesh.assignUVs(om.MIntArray(shellData.uvCounts.tolist()), om.MIntArray(shellData.uvIds.tolist()))
+    else:
+        transform = mfnMesh.create(arrayToPoints(shellData.points),
+                                   om.MIntArray(shellData.counts.tolist()),
+                                   om.MIntArray(shellData.connects.tolist()))
+
+    if shellData.faceVertexNormals is not None:
+        mfnMesh.setFaceVertexNormals(arrayToVectors(shellData.faceVertexNormals),
+                                     om.MIntArray(shellData.faceIds.tolist()),
+                                     om.MIntArray(shellData.connects.tolist()))
+
+    mfnMesh.createColorSet(colorSet, False)
+    mfnMesh.setCurrentColorSetName(colorSet)
+    mfnMesh.setVertexColors(arrayToColors(shellData.colors), om.MIntArray(range(len(shellData.colors))))
+
+    transformName = om.MFnDagNode(transform).fullPathName()
+    # polyUnite kept the materials of the duplicates, every shell face joins the shading group of its source face
+    source = getMesh(sourceName)
+    shadingEngines, shaderIds = source.mfnMesh.getConnectedShaders(source.dagPath.instanceNumber())
+    shaderIds = np.array(shaderIds, dtype=np.int64)
+    shellShaderIds = np.tile(shaderIds, len(shellData.counts) // max(len(shaderIds), 1))
+    for index in list(range(len(shadingEngines))) + [-1]:
+        faces = np.flatnonzero(shellShaderIds == index)
+        if not len(faces):
+            continue
+        engine = om.MFnDependencyNode(shadingEngines[index]).name() if index >= 0 else 'initialShadingGroup'
+        cmds.sets(['{}.f[{}:{}]'.format(transformName, first, last) for first, last in faceRanges(faces)],
+                  edit=True, forceElement=engine)
+    if name:
+        transformName = cmds.rename(transformName, name)
+    return transformName
+
+
+def transferShellWeights(sourceCluster, targetCluster, layerAmount):
+    """read the source skin weights once and write them tiled over the shell layers in a single setWeights"""
+    import maya.api.OpenMaya as om
+    import maya.api.OpenMayaAnim as oma
+
+    selection = om.MSelectionList()
+    selection.add(sourceCluster)
+    selection.add(targetCluster)
+    sourceFn = oma.MFnSkinCluster(selection.getDependNode(0))
+    targetFn = oma.MFnSkinCluster(selection.getDependNode(1))
+
+    def allVertices(mfnSkin):
+        path = mfnSkin.getPathAtIndex(0)
+        components = om.MFnSingleIndexedComponent()
+        componentObj = components.create(om.MFn.kMeshVertComponent)
+        components.setCompleteData(om.MFnMesh(path).numVertices)
+        influences = [influence.fullPathName() for influence in mfnSkin.influenceObjects()]
+        return path, componentObj, influences
+
+    sourcePath, sourceComponents, sourceInfluences = allVertices(sourceFn)
+    targetPath, targetComponents, targetInfluences = allVertices(targetFn)
+    weights, _ = sourceFn.getWeights(sourcePath, sourceComponents)
+    tiled = tileWeights(weights, layerAmount, sourceInfluences, targetInfluences)
+    targetFn.setWeights(targetPath, targetComponents, om.MIntArray(range(len(targetInfluences))),
+                        om.MDoubleArray(tiled.ravel().tolist()), normalize=False)
@@ -1,49 +1,70 @@
 # coding = utf-8
+import maya.api.OpenMaya as om
+import maya.cmds as cmds
+import maya.mel as mel
 
-def obj_vertex_painting(self, objToPaint, color):
-    sel_obj = objToPaint
-    selection = om.MSelectionList()
-    selection.add(sel_obj)
-    nodeDagPath = selection.getDagPath(0)
-    mfnMesh = om.MFnMesh(nodeDagPath)
+from MayaUtils.joint_index import getJointHierarchy
+from MayaUtils.mesh_io import getMesh
+from MayaUtils.skin_cluster_cache import getSkinClusterCache
+
+
+def obj_vertex_painting(objToPaint, color, status='VertexColor Painting ...', chunkSize=None):
+    """
+    paint every vertex of objToPaint with one color, one setVertexColors call per chunk of chunkSize vertices
+    the progress bar steps and is checked for cancellation once per chunk, returns False when cancelled
+    """
+    mfnMesh = getMesh(objToPaint).mfnMesh
+    vertexCount = mfnMesh.numVertices
+    chunkSize = min(chunkSize or vertexCount, vertexCount) or 1
     gMainProgressBar = mel.eval('$tmp = $gMainProgressBar')
 
     cmds.progressBar(gMainProgressBar,
                      edit=True,
                      beginProgress=True,
                      isInterruptable=True,
-                     status='"VertexColor Painting ...',
-                     maxValue=mfnMesh.numVertices)
+                     status=status,
+                     maxValue=max(1, -(-vertexCount // chunkSize)))
 
-    for vertId in range(mfnMesh.numVertices):
+    # the color array is allocated once, only the last chunk can be shorter
+    colors = om.MColorArray(chunkSize, om.MColor(color))
+    finished = True
+    for start in range(0, vertexCount, chunkSize):
         if cmds.progressBar(gMainProgressBar, query=True, isCancelled=True):
+            finished = False
             break
+        stop = min(start + chunkSize, vertexCount)
+        if stop - start != len(colors):
+            colors.setLength(stop - start)
+        mfnMesh.setVertexColors(colors, om.MIntArray(range(start, stop)))
         cmds.progressBar(gMainProgressBar, edit=True, step=1)
-        col = om.MColor(color)
-        mfnMesh.setVertexColor(col, vertId)
 
     cmds.progressBar(gMainProgressBar, edit=True, endProgress=True)
+    return finished
 
 
-def findRoot(self, objType=""):
-    """Find Root Joint"""
-    rootObj = None
+def findRoot(objType="joint", mesh=None):
+    """
+    Find Root Joint, of the skeleton skinning mesh when it is skinned
+    raises ValueError instead of picking one when several roots match
+    """
     if objType == "":
         print("No given type of root object")
         return None
+    if objType == "joint":
+        hierarchy = getJointHierarchy()
+        roots = (hierarchy.skeletonRoots(mesh) if mesh else []) or hierarchy.roots()
     else:
-        allObjs = cmds.ls(typ=objType)
-        for obj in allObjs:
-            parentObj = cmds.listRelatives(obj, parent=True, typ=objType)
-            if not parentObj:
-                rootObj = obj
-    return rootObj
+        roots = [obj for obj in cmds.ls(typ=objType, long=True)
+                 if not cmds.listRelatives(obj, parent=True, typ=objType)]
+    if len(roots) > 1:
+        raise ValueError('Several root {} found: {}'.format(objType, ', '.join(roots)))
+    return roots[0] if roots else None
 
 
-def bindSkinToJoint(self, joint, mesh):
+def bindSkinToJoint(joint, mesh):
     cmds.skinCluster(joint, mesh)
 
 
-def getSkinClusterFromMesh(self, mesh):
-    skinClusterStr2 = 'findRelatedSkinCluster("' + mesh + '")'
-    return mel.eval(skinClusterStr2)
\ No newline at end of file
+def getSkinClusterFromMesh(mesh):
+    """skinCluster deforming mesh, None when it is not skinned"""
+    return getSkinClusterCache().resolve(mesh)
@@ -1 +1,26 @@
-# coding = utf-8
\ No newline at end of file
+# coding = utf-8
+"""
+Maya helpers shared by the 3D_Math and FurShellMeshGenerator scripts.
+
+    from MayaUtils import getMesh
+    points = getMesh('pCube1').getPoints()
+"""
+from MayaUtils.joint_index import getJointHierarchy
+from MayaUtils.joint_index import JointHierarchy
+from MayaUtils.mesh_io import clearMeshCache
+from MayaUtils.mesh_io import getDagPath
+from MayaUtils.mesh_io import getMesh
+from MayaUtils.mesh_io import getPlugValues
+from MayaUtils.mesh_io import MeshAccessor
+from MayaUtils.mesh_io import MeshPointWriter
+from MayaUtils.normals import applyNormals
+from MayaUtils.point_bridge import arrayToPoints
+from MayaUtils.point_bridge import pointsToArray
+from MayaUtils.point_bridge import readRawPoints
+from MayaUtils.skin_cluster_cache import getSkinClusterCache
+from MayaUtils.skin_cluster_cache import SkinClusterCache
+from MayaUtils.vertex_colors import applyRandomColors
+from MayaUtils.Utils import bindSkinToJoint
+from MayaUtils.Utils import findRoot
+from MayaUtils.Utils import getSkinClusterFromMesh
+from MayaUtils.Utils import obj_vertex_painting
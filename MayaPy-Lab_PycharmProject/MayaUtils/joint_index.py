@@ -0,0 +1,147 @@
+# coding = utf-8
+"""
+Joint hierarchy of the scene indexed in one DAG traversal.
+
+JointHierarchy walks the DAG once with MItDag and keeps, for every joint by
+full path, its parent joint, its root joint and its depth below that root.
+Roots, root of a joint and the skeleton of a skinned mesh are then dictionary
+lookups. Joint added / removed, DAG change and DAG node rename callbacks only
+mark the index dirty, it is rebuilt by the next query. Short or partial names
+are resolved to the full path through a selection list, no command is run.
+
+    hierarchy = getJointHierarchy()
+    hierarchy.roots()
+    hierarchy.rootOf('|root|spine|arm')
+    hierarchy.skeletonRoots('body')
+"""
+import maya.api.OpenMaya as om
+import maya.cmds as cmds
+
+from MayaUtils.skin_cluster_cache import getSkinClusterCache
+
+
+class JointHierarchy(object):
+    def __init__(self, watch=True):
+        super(JointHierarchy, self).__init__()
+        self._parents = {}
+        self._roots = {}
+        self._depths = {}
+        self._rootList = []
+        self._dirty = True
+        self._callbackIds = []
+        if watch:
+            self._callbackIds = [
+                om.MDGMessage.addNodeAddedCallback(self._invalidate, 'joint'),
+                om.MDGMessage.addNodeRemovedCallback(self._invalidate, 'joint'),
+                om.MDagMessage.addAllDagChangesCallback(self._invalidate),
+                # a null MObject watches every node, renaming any DAG node above a joint changes its path
+                om.MNodeMessage.addNameChangedCallback(om.MObject(), self._invalidateOnRename),
+            ]
+
+    def _invalidate(self, *args):
+        self._dirty = True
+
+    def _invalidateOnRename(self, node, *args):
+        if node.hasFn(om.MFn.kDagNode):
+            self._dirty = True
+
+    def close(self):
+        """stop watching the scene"""
+        if self._callbackIds:
+            om.MMessage.removeCallbacks(self._callbackIds)
+            self._callbackIds = []
+
+    def __del__(self):
+        self.close()
+
+    def rebuild(self):
+        self._parents.clear()
+        self._roots.clear()
+        self._depths.clear()
+        self._rootList = []
+        # depth first, so every parent joint is indexed before its children
+        dagIt = om.MItDag(om.MItDag.kDepthFirst, om.MFn.kJoint)
+        while not dagIt.isDone():
+            path = dagIt.getPath()
+            joint = path.fullPathName()
+            parentPath = om.MDagPath(path)
+            parentPath.pop()
+            parent = parentPath.fullPathName() if parentPath.length() and parentPath.hasFn(om.MFn.kJoint) else None
+            if parent in self._roots:
+                self._parents[joint] = parent
+                self._roots[joint] = self._roots[parent]
+                self._depths[joint] = self._depths[parent] + 1
+            else:
+                # a joint under a plain transform starts its own skeleton
+                self._parents[joint] = None
+                self._roots[joint] = joint
+                self._depths[joint] = 0
+                self._rootList.append(joint)
+            dagIt.next()
+        self._dirty = False
+
+    def _index(self):
+        if self._dirty:
+            self.rebuild()
+
+    def _fullPath(self, joint):
+        if joint in self._roots:
+            return joint
+        selection = om.MSelectionList()
+        try:
+            selection.add(joint)
+            path = selection.getDagPath(0) if selection.length() == 1 else None
+        except (RuntimeError, TypeError):
+            path = None
+        if path is None or not path.hasFn(om.MFn.kJoint):
+            raise ValueError('{} does not name exactly one joint.'.format(joint))
+        fullPath = path.fullPathName()
+        if fullPath not in self._roots:
+            # renamed or reparented since the last rebuild without a callback reaching us
+            self.rebuild()
+        return fullPath
+
+    def __contains__(self, joint):
+        self._index()
+        try:
+            self._fullPath(joint)
+        except ValueError:
+            return False
+        return True
+
+    def roots(self):
+        """full paths of every root joint"""
+        self._index()
+        return list(self._rootList)
+
+    def parentOf(self, joint):
+        self._index()
+        return self._parents[self._fullPath(joint)]
+
+    def rootOf(self, joint):
+        self._index()
+        return self._roots[self._fullPath(joint)]
+
+    def depthOf(self, joint):
+        self._index()
+        return self._depths[self._fullPath(joint)]
+
+    def skeletonRoots(self, mesh):
+        """root joints of the influences skinning mesh, sorted"""
+        self._index()
+        skinCluster = getSkinClusterCache().resolve(mesh)
+        if skinCluster is None:
+            return []
+        influences = cmds.ls(cmds.skinCluster(skinCluster, query=True, influence=True) or [], long=True, type='joint')
+        return sorted(set(self._roots[self._fullPath(joint)] for joint in influences))
+
+
+_hierarchy = None
+
+
+def getJointHierarchy():
+    """the shared JointHierarchy of the session, created on first use"""
+    global _hierarchy
+    if _hierarchy is None:
+        _hierarchy = JointHierarchy()
+    return _hierarchy
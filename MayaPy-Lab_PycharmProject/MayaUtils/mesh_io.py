@@ -0,0 +1,191 @@
+# coding = utf-8
+"""
+Mesh I/O shared by the 3D_Math and FurShellMeshGenerator scripts.
+
+getMesh(name) returns a cached MeshAccessor: the DAG path and MFnMesh of a
+mesh, with its points, normals and colors read and written as NumPy arrays in
+one API call each, converted through MayaUtils.point_bridge. The accessor is kept
+per name until its node is deleted, clearMeshCache() forgets all of them.
+
+MeshPointWriter replaces the per-vertex
+    cmds.xform("{0}.vtx[{1}]".format(mesh, index), t=point, a=True, ws=True)
+loops with one MFnMesh.setPoints per frame. The MFnMesh is kept between frames;
+each frame builds a new MPointArray from the rows of the array, which is
+cheaper than refilling one point by point from Python.
+
+getPlugValues reads one attribute of many nodes through a single selection
+list and their plugs, without a cmds.getAttr per node.
+"""
+from __future__ import print_function
+from timeit import default_timer
+
+import numpy as np
+
+import maya.api.OpenMaya as om
+import maya.cmds as cmds
+
+from MayaUtils.point_bridge import arrayToColors
+from MayaUtils.point_bridge import arrayToPoints
+from MayaUtils.point_bridge import arrayToVectors
+from MayaUtils.point_bridge import colorsToArray
+from MayaUtils.point_bridge import pointsToArray
+from MayaUtils.point_bridge import rawToWorld
+from MayaUtils.point_bridge import readRawPoints
+from MayaUtils.point_bridge import vectorsToArray
+
+
+def getDagPath(name):
+    selection = om.MSelectionList()
+    selection.add(name)
+    return selection.getDagPath(0)
+
+
+class MeshAccessor(object):
+    """DAG path and MFnMesh of one mesh, with NumPy reads and single-call writes"""
+
+    def __init__(self, dagPath):
+        super(MeshAccessor, self).__init__()
+        self.dagPath = om.MDagPath(dagPath)
+        self.dagPath.extendToShape()
+        self.mfnMesh = om.MFnMesh(self.dagPath)
+        self._handle = om.MObjectHandle(self.dagPath.node())
+        self._pointBuffer = om.MPointArray()
+
+    @property
+    def name(self):
+        return self.dagPath.fullPathName()
+
+    @property
+    def numVertices(self):
+        return self.mfnMesh.numVertices
+
+    def isValid(self):
+        return self._handle.isValid() and self.dagPath.isValid()
+
+    def getPoints(self, space=om.MSpace.kObject):
+        """(N, 3) float64 points, copied from the raw vertex buffer in one go"""
+        points = readRawPoints(self.name)
+        if space == om.MSpace.kWorld:
+            return rawToWorld(points, self.dagPath)
+        if space == om.MSpace.kObject:
+            return points.astype(np.float64)
+        return pointsToArray(self.mfnMesh.getPoints(space))
+
+    def setPoints(self, points, space=om.MSpace.kObject):
+        # the buffer is only filled when MPointArray refuses the rows, see arrayToPoints
+        self.mfnMesh.setPoints(arrayToPoints(points, self._pointBuffer), space)
+        self.mfnMesh.updateSurface()
+
+    def getVertices(self):
+        """polygon counts and vertex ids as int64 arrays"""
+        counts, connects = self.mfnMesh.getVertices()
+        return np.array(counts, dtype=np.int64), np.array(connects, dtype=np.int64)
+
+    def getVertexNormals(self, angleWeighted=False, space=om.MSpace.kObject):
+        return vectorsToArray(self.mfnMesh.getVertexNormals(angleWeighted, space))
+
+    def setVertexNormals(self, normals, vertexIds=None, space=om.MSpace.kObject):
+        if vertexIds is None:
+            vertexIds = range(len(normals))
+        self.mfnMesh.setVertexNormals(arrayToVectors(normals), om.MIntArray(list(vertexIds)), space)
+
+    def getFaceVertexNormals(self, space=om.MSpace.kObject):
+        """(FV, 3) one normal per face vertex, in the order of getVertices' connects"""
+        normals = vectorsToArray(self.mfnMesh.getNormals(space))
+        _, normalIds = self.mfnMesh.getNormalIds()
+        return normals[np.array(normalIds, dtype=np.int64)]
+
+    def getColors(self, colorSet=None):
+        """(N, 4) vertex colors of colorSet, the current one by default"""
+        if colorSet is None:
+            return colorsToArray(self.mfnMesh.getVertexColors())
+        return colorsToArray(self.mfnMesh.getVertexColors(colorSet))
+
+    def setColors(self, colors, vertexIds=None):
+        if vertexIds is None:
+            vertexIds = range(len(colors))
+        self.mfnMesh.setVertexColors(arrayToColors(colors), om.MIntArray(list(vertexIds)))
+
+
+_meshes = {}
+
+
+def getMesh(name):
+    """cached MeshAccessor of the mesh, or mesh transform, called name"""
+    mesh = _meshes.get(name)
+    if mesh is None or not mesh.isValid():
+        mesh = _meshes[name] = MeshAccessor(getDagPath(name))
+    return mesh
+
+
+def clearMeshCache():
+    _meshes.clear()
+
+
+def getPlugValues(nodes, attribute):
+    """(N,) values of a numeric attribute, or (N, K) for a compound like translate, on every node"""
+    selection = om.MSelectionList()
+    values = []
+    for node in nodes:
+        # one node at a time, adding a name of a node already in the list would not add a new item
+        selection.clear()
+        selection.add(node)
+        plug = om.MFnDependencyNode(selection.getDependNode(0)).findPlug(attribute, False)
+        if plug.isCompound:
+            values.append([plug.child(k).asDouble() for k in range(plug.numChildren())])
+        else:
+            values.append(plug.asDouble())
+    return np.array(values, dtype=np.float64)
+
+
+class MeshPointWriter(object):
+    """writes (N, 3) point arrays or lists to a mesh in a single setPoints call"""
+
+    def __init__(self, meshName, space=om.MSpace.kWorld):
+        super(MeshPointWriter, self).__init__()
+        self.meshName = meshName
+        self.space = space
+        self.mesh = getMesh(meshName)
+        self.mfnMesh = self.mesh.mfnMesh
+
+    def __len__(self):
+        return self.mfnMesh.numVertices
+
+    def readPoints(self):
+        """current (N, 3) points"""
+        return self.mesh.getPoints(self.space)
+
+    def write(self, points):
+        """move every vertex to points, same result as an absolute xform per vertex"""
+        self.mesh.setPoints(points, self.space)
+
+
+def xformPoints(meshName, points):
+    """per-vertex reference path the writer replaces"""
+    for index, point in enumerate(points):
+        cmds.xform("{0}.vtx[{1}]".format(meshName, index), t=point, a=True, ws=True)
+
+
+def benchmark(counts=(100, 1000, 10000, 100000), frames=3):
+    """print the seconds per frame of per-vertex xform against MeshPointWriter on planes of growing size"""
+    for count in counts:
+        side = max(1, int(round(count ** 0.5)) - 1)
+        plane = cmds.polyPlane(w=100, h=100, sw=side, sh=side, ch=False)[0]
+        try:
+            writer = MeshPointWriter(plane)
+            rest = writer.readPoints().tolist()
+            timings = {}
+            for name, write in (('xform', lambda points: xformPoints(plane, points)), ('setPoints', writer.write)):
+                start = default_timer()
+                for frame in range(frames):
+                    write([[x, y + 0.01 * (frame + 1), z] for x, y, z in rest])
+                timings[name] = (default_timer() - start) / frames
+            print('{:>7} vertices: xform {:.4f}s  setPoints {:.4f}s  speedup {:.1f}x'.format(
+                len(rest), timings['xform'], timings['setPoints'], timings['xform'] / timings['setPoints']))
+        finally:
+            cmds.delete(plane)
+            clearMeshCache()
+
+
+if __name__ == '__main__':
+    benchmark()
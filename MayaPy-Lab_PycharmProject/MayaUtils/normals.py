@@ -0,0 +1,80 @@
+# coding = utf-8
+"""
+Vertex normals computed for the whole mesh at once and set in one call.
+
+    applyNormals('pSphere1', mode='radial')                  # away from the pivot
+    applyNormals('pSphere1', mode='center', center=(0, 5, 0))
+    applyNormals('pSphere1', mode='smooth')                  # area weighted face average
+
+radialNormals and smoothNormals only need NumPy arrays, applyNormals reads the
+points once through getMesh and writes every normal with setVertexNormals.
+"""
+import numpy as np
+
+import maya.api.OpenMaya as om
+import maya.cmds as cmds
+
+from MayaUtils.mesh_io import getMesh
+
+MODES = ('radial', 'center', 'smooth')
+
+
+def _normalized(vectors):
+    lengths = np.sqrt(np.einsum('ij,ij->i', vectors, vectors))
+    degenerate = lengths == 0
+    lengths[degenerate] = 1.0
+    return vectors / lengths[:, None], degenerate
+
+
+def smoothNormals(points, counts, connects):
+    """(N, 3) vertex normals, the sum of the area weighted normals of the faces around every vertex"""
+    points = np.asarray(points, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.int64)
+    connects = np.asarray(connects, dtype=np.int64)
+    # Newell's method: the sum of p_i x p_i+1 around a polygon is twice its area along its normal
+    firsts = np.cumsum(counts) - counts
+    faceIds = np.repeat(np.arange(len(counts)), counts)
+    nextCorners = np.arange(len(connects)) + 1
+    lastCorners = firsts + counts - 1
+    nextCorners[lastCorners] = firsts
+    cross = np.cross(points[connects], points[connects[nextCorners]])
+    faceNormals = np.stack([np.bincount(faceIds, cross[:, k], minlength=len(counts)) for k in range(3)], axis=1)
+    vertexNormals = np.stack([np.bincount(connects, faceNormals[faceIds, k], minlength=len(points))
+                              for k in range(3)], axis=1)
+    return _normalized(vertexNormals)[0]
+
+
+def radialNormals(points, center, fallback=None):
+    """(N, 3) unit vectors from center to every point, fallback normals where a point sits on the center"""
+    normals, degenerate = _normalized(np.asarray(points, dtype=np.float64) - np.asarray(center, dtype=np.float64))
+    if degenerate.any():
+        normals[degenerate] = (0.0, 1.0, 0.0) if fallback is None else np.asarray(fallback)[degenerate]
+    return normals
+
+
+def applyNormals(meshName, mode='radial', center=(0.0, 0.0, 0.0), space=om.MSpace.kWorld):
+    """
+    compute and set the vertex normals of meshName, returns them as (N, 3)
+    radial points away from the rotate pivot, center away from center and smooth averages the faces
+    """
+    if mode not in MODES:
+        raise ValueError('Unknown normal mode {!r}, expected one of {}.'.format(mode, ', '.join(MODES)))
+    mesh = getMesh(meshName)
+    points = mesh.getPoints(space)
+    counts, connects = mesh.getVertices()
+    if mode == 'smooth':
+        normals = smoothNormals(points, counts, connects)
+    else:
+        if mode == 'radial':
+            transform = cmds.listRelatives(mesh.name, parent=True, fullPath=True)[0]
+            if space == om.MSpace.kWorld:
+                center = cmds.xform(transform, query=True, worldSpace=True, rotatePivot=True)
+            else:
+                center = cmds.xform(transform, query=True, objectSpace=True, rotatePivot=True)
+        fallback = None
+        offsets = points - np.asarray(center, dtype=np.float64)
+        if (np.einsum('ij,ij->i', offsets, offsets) == 0).any():
+            fallback = smoothNormals(points, counts, connects)
+        normals = radialNormals(points, center, fallback)
+    mesh.setVertexNormals(normals, space=space)
+    return normals
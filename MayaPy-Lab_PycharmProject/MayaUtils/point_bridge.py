@@ -0,0 +1,174 @@
+# coding = utf-8
+"""
+Mesh point buffers to NumPy and back.
+
+readRawPoints maps the float32 vertex buffer MFnMesh.getRawPoints (OpenMaya
+1.0) hands out as an (N, 3) NumPy view with ctypes: a zero-copy view, or one
+memcpy with copy=True. The view stays valid until the mesh is next evaluated.
+The raw points are in object space, rawToWorld applies the world matrix to all
+of them at once.
+
+pointsToArray / arrayToPoints convert OpenMaya 2.0 MPointArrays, and
+vectorsToArray / arrayToVectors and colorsToArray / arrayToColors the vector and
+color arrays the same way. Those expose no buffer, so they still cost a Python
+object per element: the ...ToArray functions read every element once into one
+flat buffer, the arrayTo... ones hand the array type one list of rows. Only
+readRawPoints avoids that; use it, or MeshAccessor.getPoints, to read a mesh.
+Without NumPy the point functions fall back to flat array('d') buffers of
+x, y, z values.
+
+benchmark() times these paths against the per-element loops for growing meshes.
+"""
+from __future__ import print_function
+from array import array
+from itertools import chain
+from operator import attrgetter
+from timeit import default_timer
+import ctypes
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import maya.api.OpenMaya as om
+
+
+def _rawMeshFn(name):
+    import maya.OpenMaya as om1
+
+    selection = om1.MSelectionList()
+    selection.add(name)
+    dagPath = om1.MDagPath()
+    selection.getDagPath(0, dagPath)
+    dagPath.extendToShape()
+    return om1.MFnMesh(dagPath)
+
+
+def readRawPoints(name, copy=True):
+    """
+    (N, 3) float32 object space points of the mesh, a view of Maya's own buffer unless copy
+    without NumPy a flat array('f') copy
+    """
+    mfnMesh = _rawMeshFn(name)
+    count = mfnMesh.numVertices()
+    buffer = (ctypes.c_float * (3 * count)).from_address(int(mfnMesh.getRawPoints()))
+    if np is None:
+        return array('f', buffer)
+    points = np.ctypeslib.as_array(buffer).reshape(count, 3)
+    return points.copy() if copy else points
+
+
+def rawToWorld(points, dagPath):
+    """(N, 3) float64 world space points of the (N, 3) object space points of dagPath"""
+    matrix = np.array(list(dagPath.inclusiveMatrix()), dtype=np.float64).reshape(4, 4)
+    # maya matrices multiply row vectors: p' = p * M
+    return np.dot(np.asarray(points, dtype=np.float64), matrix[:3, :3]) + matrix[3, :3]
+
+
+def _toFlat(items, fields):
+    # one flat float64 buffer of the fields of every element
+    flat = chain.from_iterable(map(attrgetter(*fields), items))
+    if np is None:
+        return array('d', flat)
+    return np.fromiter(flat, dtype=np.float64, count=len(fields) * len(items)).reshape(-1, len(fields))
+
+
+def _fromRows(arrayType, itemType, rows):
+    # the array type parses the rows itself where it can, one item per row otherwise
+    try:
+        return arrayType(rows)
+    except TypeError:
+        return arrayType([itemType(*row) for row in rows])
+
+
+def pointsToArray(points):
+    """(N, 3) float64 array of an MPointArray, a flat array('d') without NumPy, one tuple per point"""
+    return _toFlat(points, ('x', 'y', 'z'))
+
+
+def arrayToPoints(points, buffer=None):
+    """
+    MPointArray of (N, 3) points, an ndarray or a flat sequence of x, y, z
+    built from one list of rows, buffer is only filled point by point when the API refuses the rows
+    """
+    if np is not None:
+        rows = np.asarray(points, dtype=np.float64).reshape(-1, 3).tolist()
+    else:
+        flat = list(points)
+        rows = [flat[i:i + 3] for i in range(0, len(flat), 3)]
+    try:
+        return om.MPointArray(rows)
+    except TypeError:
+        buffer = om.MPointArray() if buffer is None else buffer
+        if len(buffer) != len(rows):
+            buffer.setLength(len(rows))
+        for index, (x, y, z) in enumerate(rows):
+            buffer[index] = om.MPoint(x, y, z)
+        return buffer
+
+
+def vectorsToArray(vectors):
+    """(N, 3) float64 array of an MVectorArray or MFloatVectorArray"""
+    return _toFlat(vectors, ('x', 'y', 'z'))
+
+
+def arrayToVectors(vectors):
+    """MVectorArray of (N, 3) vectors"""
+    return _fromRows(om.MVectorArray, om.MVector, np.asarray(vectors, dtype=np.float64).reshape(-1, 3).tolist())
+
+
+def colorsToArray(colors):
+    """(N, 4) float64 RGBA array of an MColorArray"""
+    return _toFlat(colors, ('r', 'g', 'b', 'a'))
+
+
+def arrayToColors(colors):
+    """MColorArray of (N, 3) RGB or (N, 4) RGBA colors"""
+    colors = np.asarray(colors, dtype=np.float64)
+    return _fromRows(om.MColorArray, om.MColor, colors.reshape(-1, colors.shape[-1]).tolist())
+
+
+def benchmark(counts=(1000, 10000, 100000, 1000000)):
+    """print read / write seconds of the per-element loops and of the bridge on planes of growing size"""
+    import maya.cmds as cmds
+
+    for count in counts:
+        side = max(1, int(round(count ** 0.5)) - 1)
+        plane = cmds.polyPlane(w=100, h=100, sw=side, sh=side, ch=False)[0]
+        try:
+            selection = om.MSelectionList()
+            selection.add(plane)
+            mfnMesh = om.MFnMesh(selection.getDagPath(0))
+            timings = {}
+
+            start = default_timer()
+            slow = [(p.x, p.y, p.z) for p in mfnMesh.getPoints()]
+            timings['readLoop'] = default_timer() - start
+            start = default_timer()
+            fast = readRawPoints(plane)
+            timings['readRaw'] = default_timer() - start
+            start = default_timer()
+            pointsToArray(mfnMesh.getPoints())
+            timings['readFlat'] = default_timer() - start
+
+            start = default_timer()
+            buffer = om.MPointArray()
+            buffer.setLength(len(slow))
+            for index, (x, y, z) in enumerate(slow):
+                buffer[index] = om.MPoint(x, y, z)
+            mfnMesh.setPoints(buffer)
+            timings['writeLoop'] = default_timer() - start
+            start = default_timer()
+            mfnMesh.setPoints(arrayToPoints(fast))
+            timings['writeBridge'] = default_timer() - start
+
+            print('{:>8} points: '.format(len(slow)) + '  '.join(
+                '{} {:.4f}s'.format(name, timings[name]) for name in
+                ('readLoop', 'readRaw', 'readFlat', 'writeLoop', 'writeBridge')))
+        finally:
+            cmds.delete(plane)
+
+
+if __name__ == '__main__':
+    benchmark()
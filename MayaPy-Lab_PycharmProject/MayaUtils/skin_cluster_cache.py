@@ -0,0 +1,96 @@
+# coding = utf-8
+"""
+Mesh to skinCluster resolution without MEL.
+
+SkinClusterCache walks the dependency graph upstream of a mesh shape with
+MItDependencyGraph and keeps the first skinCluster whose output geometry is
+that shape, like findRelatedSkinCluster: clusters reached through blendShapes
+or wraps of other skinned meshes are passed over. Results are memoized by the
+MObjectHandle hash of the shape.
+Adding or removing a skinCluster clears the cache and entries whose nodes were
+deleted are dropped when met, so names never need quoting or re-evaluating.
+
+    cache = getSkinClusterCache()
+    cache.resolve('body')
+    cache.resolveMany(cmds.ls(type='mesh'))
+"""
+import maya.api.OpenMaya as om
+import maya.api.OpenMayaAnim as oma
+
+
+class SkinClusterCache(object):
+    def __init__(self, watch=True):
+        super(SkinClusterCache, self).__init__()
+        # shape handle hash -> (shape handle, skinCluster handle or None)
+        self._entries = {}
+        self._callbackIds = []
+        if watch:
+            self._callbackIds = [
+                om.MDGMessage.addNodeAddedCallback(self._invalidate, 'skinCluster'),
+                om.MDGMessage.addNodeRemovedCallback(self._invalidate, 'skinCluster'),
+            ]
+
+    def _invalidate(self, *args):
+        self._entries.clear()
+
+    def close(self):
+        """stop watching the scene"""
+        if self._callbackIds:
+            om.MMessage.removeCallbacks(self._callbackIds)
+            self._callbackIds = []
+
+    def __del__(self):
+        self.close()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+    @staticmethod
+    def _findSkinCluster(shape):
+        graphIt = om.MItDependencyGraph(shape, om.MFn.kSkinClusterFilter, om.MItDependencyGraph.kUpstream)
+        while not graphIt.isDone():
+            skinCluster = graphIt.currentNode()
+            if shape in oma.MFnSkinCluster(skinCluster).getOutputGeometry():
+                return om.MObjectHandle(skinCluster)
+            graphIt.next()
+        return None
+
+    def resolveNode(self, dagPath):
+        """MObject of the skinCluster deforming the mesh at dagPath, None when it is not skinned"""
+        shapePath = om.MDagPath(dagPath)
+        shapePath.extendToShape()
+        shape = shapePath.node()
+        shapeHandle = om.MObjectHandle(shape)
+        entry = self._entries.get(shapeHandle.hashCode())
+        if entry is None or entry[0] != shapeHandle or (entry[1] is not None and not entry[1].isValid()):
+            entry = self._entries[shapeHandle.hashCode()] = (shapeHandle, self._findSkinCluster(shape))
+        return None if entry[1] is None else entry[1].object()
+
+    def resolve(self, mesh):
+        """name of the skinCluster deforming mesh, None when it is not skinned"""
+        return self.resolveMany([mesh])[0]
+
+    def resolveMany(self, meshes):
+        """skinCluster names of many meshes in order, one selection list is reused for all of them"""
+        selection = om.MSelectionList()
+        skinClusters = []
+        for mesh in meshes:
+            selection.clear()
+            selection.add(mesh)
+            node = self.resolveNode(selection.getDagPath(0))
+            skinClusters.append(None if node is None else om.MFnDependencyNode(node).name())
+        return skinClusters
+
+
+_cache = None
+
+
+def getSkinClusterCache():
+    """the shared SkinClusterCache of the session, created on first use"""
+    global _cache
+    if _cache is None:
+        _cache = SkinClusterCache()
+    return _cache
@@ -0,0 +1,45 @@
+# coding = utf-8
+"""
+Random ID colors drawn in one vectorized call from a seeded generator.
+
+    applyRandomColors('crowd', mode='shell', seed=7)
+
+randomColors(count, seed) gives the same (count, 4) RGBA colors for the same
+seed. applyRandomColors draws one color per vertex, face or shell of the mesh
+and applies them with a single setVertexColors or setFaceColors call.
+"""
+import numpy as np
+
+import maya.api.OpenMaya as om
+
+from MayaUtils.mesh_io import arrayToColors
+from MayaUtils.mesh_io import getMesh
+
+MODES = ('vertex', 'face', 'shell')
+
+
+def randomColors(count, seed=None, alpha=1.0):
+    """(count, 4) uniform random RGB colors with a constant alpha, reproducible for a given seed"""
+    colors = np.empty((count, 4))
+    colors[:, :3] = np.random.RandomState(seed).random_sample((count, 3))
+    colors[:, 3] = alpha
+    return colors
+
+
+def applyRandomColors(meshName, mode='vertex', seed=None, alpha=1.0):
+    """color every vertex, face or shell of meshName with its own random color, returns the drawn colors"""
+    if mode not in MODES:
+        raise ValueError('Unknown color mode {!r}, expected one of {}.'.format(mode, ', '.join(MODES)))
+    mesh = getMesh(meshName)
+    mfnMesh = mesh.mfnMesh
+    if mode == 'face':
+        colors = randomColors(mfnMesh.numPolygons, seed, alpha)
+        mfnMesh.setFaceColors(arrayToColors(colors), om.MIntArray(range(len(colors))))
+    elif mode == 'shell':
+        shellCount, shellIds = mfnMesh.getMeshShellsIds(om.MFn.kMeshVertComponent)
+        colors = randomColors(shellCount, seed, alpha)
+        mesh.setColors(colors[np.array(shellIds, dtype=np.int64)])
+    else:
+        colors = randomColors(mfnMesh.numVertices, seed, alpha)
+        mesh.setColors(colors)
+    return colors